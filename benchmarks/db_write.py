@@ -0,0 +1,62 @@
+"""
+Write throughput of core.database against the old open/insert/commit/close pattern.
+
+Usage: uv run python benchmarks/db_write.py [writes]
+"""
+import sys
+import time
+import sqlite3
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from core import database
+
+
+def bench_open_close(db_path: str, writes: int) -> float:
+    """The pre-pooling pattern: a fresh rollback-journal connection per statement."""
+    start = time.perf_counter()
+    for i in range(writes):
+        conn = sqlite3.connect(db_path)
+        conn.execute('DELETE FROM watchlist WHERE movie_id = ? AND media_type = ?', (i, "movie"))
+        conn.execute('INSERT INTO watchlist (movie_id, media_type) VALUES (?, ?)', (i, "movie"))
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - start
+
+
+def bench_shared(writes: int) -> float:
+    start = time.perf_counter()
+    for i in range(writes):
+        database.remove_from_watchlist(i, "movie")
+        database.add_to_watchlist(i, "movie")
+    return time.perf_counter() - start
+
+
+def main():
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        old_db = str(Path(tmp) / "old.db")
+        database.DB_NAME = old_db
+        database.init_db()
+        database.close_connection()
+        # Back to the default rollback journal for the baseline
+        conn = sqlite3.connect(old_db)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+        old = bench_open_close(old_db, writes)
+
+        database.DB_NAME = str(Path(tmp) / "new.db")
+        database.init_db()
+        new = bench_shared(writes)
+        database.close_connection()
+
+    print(f"{writes} writes")
+    print(f"open/close per write: {old:.3f}s ({writes / old:,.0f} writes/s)")
+    print(f"shared WAL connection: {new:.3f}s ({writes / new:,.0f} writes/s)")
+    print(f"speedup: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Cold-start cost of the server: how long `import main` takes under `python -X importtime`,
+which packages dominate it, and whether any of the lazily imported dependencies crept
+back onto the startup path.
+
+Usage: uv run python benchmarks/startup.py [runs] [budget_ms]
+
+With a budget, exits non-zero when the median import time exceeds it or a lazy
+dependency is imported at startup, so it can guard against regressions in CI.
+"""
+import sys
+import statistics
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+
+# Imported on first use by the tools that need them; never at startup
+LAZY_MODULES = ["dateparser", "googleapiclient", "google_auth_oauthlib", "google.oauth2", "pytz", "tzlocal"]
+TOP_PACKAGES = 10
+
+
+def import_profile() -> dict:
+    """One fresh interpreter importing main: {module: (self_us, cumulative_us)}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SRC, capture_output=True, text=True, check=True,
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    # The first run also warms the bytecode cache, so it is not counted
+    import_profile()
+    totals, by_package = [], defaultdict(list)
+    for _ in range(runs):
+        profile = import_profile()
+        totals.append(profile["main"][1] / 1000)
+        packages = defaultdict(int)
+        for name, (self_us, _) in profile.items():
+            packages[name.split(".")[0]] += self_us
+        for package, self_us in packages.items():
+            by_package[package].append(self_us / 1000)
+    eager = [name for name in LAZY_MODULES if name in profile]
+
+    median = statistics.median(totals)
+    print(f"import main: median {median:.0f} ms over {runs} runs (min {min(totals):.0f}, max {max(totals):.0f})")
+    print("Slowest packages (median self time):")
+    ranked = sorted(by_package.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for package, times in ranked[:TOP_PACKAGES]:
+        print(f"  {package:<24} {statistics.median(times):7.1f} ms")
+    print(f"Lazy dependencies imported at startup: {', '.join(eager) or 'none'}")
+
+    if budget_ms is not None and (median > budget_ms or eager):
+        print(f"FAIL: budget {budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
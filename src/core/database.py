@@ -1,23 +1,99 @@
+import re
 import sqlite3
-from typing import List, Tuple, Dict, Any
+import threading
+import contextlib
+import unicodedata
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 DB_NAME = str(BASE_DIR / "cinemate.db")
 
-def get_connection():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
+# Upper bound on cached API responses, enforced every API_CACHE_PRUNE_INTERVAL writes
+API_CACHE_MAX_ENTRIES = 5000
+API_CACHE_PRUNE_INTERVAL = 100
+_api_cache_writes = 0
 
-def init_db():
-    """Initialize the database with required tables."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Movies table to cache movie/tv details
-    # We add media_type. Primary key is still id, which is risky if collision, 
-    # but for simplicity we'll assume no collision or handle it later.
-    # Ideally PK should be (id, media_type).
+# Tuning for the shared connection: page cache in KiB, memory-mapped I/O in bytes,
+# and how many prepared statements sqlite3 keeps around for reuse
+DB_CACHE_SIZE_KB = 16 * 1024
+DB_MMAP_SIZE = 64 * 1024 * 1024
+DB_STATEMENT_CACHE = 256
+
+# One connection for the server's lifetime. The lock serialises it between the event
+# loop and any worker threads.
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.RLock()
+
+def get_connection() -> sqlite3.Connection:
+    """Return the shared connection, opening and tuning it on first use."""
+    global _conn
+    with _lock:
+        if _conn is None:
+            # Autocommit mode: transactions are opened explicitly by transaction()
+            conn = sqlite3.connect(
+                DB_NAME,
+                check_same_thread=False,
+                isolation_level=None,
+                cached_statements=DB_STATEMENT_CACHE,
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+            conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA busy_timeout=5000')
+            _conn = conn
+        return _conn
+
+def close_connection():
+    """Close the shared connection (on server shutdown)."""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.execute('PRAGMA optimize')
+            _conn.close()
+            _conn = None
+
+@contextlib.contextmanager
+def connection():
+    """Hold the shared connection for a read."""
+    with _lock:
+        yield get_connection()
+
+@contextlib.contextmanager
+def transaction():
+    """
+    Run the enclosed statements in one transaction on the shared connection.
+    Commits on success, rolls back on error; nested uses join the outer transaction.
+    """
+    with _lock:
+        conn = get_connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            # A failed COMMIT (busy, disk full) leaves the transaction open; close it so
+            # later transactions do not join it and never commit
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+
+# --- Schema migrations ---
+# Each migration upgrades the schema by one version; PRAGMA user_version records the
+# last one applied. Append new migrations to MIGRATIONS, never edit applied ones.
+
+def _columns(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    return [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+
+def _migration_1_base_schema(cursor: sqlite3.Cursor):
+    """Movies cache, history and watchlist tables."""
+    # Movies table to cache movie/tv details, keyed by (id, media_type)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS movies (
             id INTEGER,
@@ -52,157 +128,951 @@ def init_db():
         )
     ''')
     
-    # Migration: Check if media_type exists in movies, if not add it
-    try:
-        cursor.execute('SELECT media_type FROM movies LIMIT 1')
-    except Exception:
-        print("Migrating database: Adding media_type columns...")
-        try:
-            cursor.execute('ALTER TABLE movies ADD COLUMN media_type TEXT DEFAULT "movie"')
-            cursor.execute('ALTER TABLE history ADD COLUMN media_type TEXT DEFAULT "movie"')
-            cursor.execute('ALTER TABLE watchlist ADD COLUMN media_type TEXT DEFAULT "movie"')
-        except Exception as e:
-            print(f"Migration warning: {e}")
+    # Databases created before TV support lack media_type
+    for table in ("movies", "history", "watchlist"):
+        if "media_type" not in _columns(cursor, table):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN media_type TEXT DEFAULT 'movie'")
 
-    conn.commit()
-    conn.close()
+def _migration_2_api_cache(cursor: sqlite3.Cursor):
+    """Cached TMDB responses (JSON) with their expiry time (unix seconds)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS api_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_api_cache_expires ON api_cache(expires_at)')
 
-def add_movie_cache(movie_id: int, title: str, genre: str, release_date: str, overview: str, media_type: str = "movie"):
-    """Cache movie details to avoid repeated API calls."""
-    conn = get_connection()
-    cursor = conn.cursor()
+def _migration_3_history_watchlist_indexes(cursor: sqlite3.Cursor):
+    """One row per title in history/watchlist, plus covering indexes for the sorted listings."""
+    # Keep only the latest row per title before enforcing uniqueness
     cursor.execute('''
-        INSERT OR REPLACE INTO movies (id, title, genre, release_date, overview, media_type)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (movie_id, title, genre, release_date, overview, media_type))
-    conn.commit()
-    conn.close()
+        DELETE FROM history WHERE id NOT IN (
+            SELECT MAX(id) FROM history GROUP BY movie_id, media_type
+        )
+    ''')
+    cursor.execute('''
+        DELETE FROM watchlist WHERE id NOT IN (
+            SELECT MAX(id) FROM watchlist GROUP BY movie_id, media_type
+        )
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX idx_history_movie ON history(movie_id, media_type)')
+    cursor.execute('CREATE UNIQUE INDEX idx_watchlist_movie ON watchlist(movie_id, media_type)')
+    cursor.execute('''
+        CREATE INDEX idx_history_watched_at
+        ON history(watched_at, movie_id, media_type, rating, review)
+    ''')
+    cursor.execute('CREATE INDEX idx_watchlist_added_at ON watchlist(added_at, movie_id, media_type)')
 
-def add_to_history(movie_id: int, rating: float, review: str, media_type: str = "movie"):
-    conn = get_connection()
-    cursor = conn.cursor()
-    # Remove existing entry for this movie to avoid duplicates
-    cursor.execute('DELETE FROM history WHERE movie_id = ? AND media_type = ?', (movie_id, media_type))
+# movies.genre holds TMDB ids joined with ", ", so wrapping it in brackets gives a JSON array
+_GENRE_IDS_JSON = "CASE WHEN json_valid('[' || COALESCE({0}, '') || ']') THEN '[' || COALESCE({0}, '') || ']' ELSE '[]' END"
+
+def _migration_4_normalized_genres(cursor: sqlite3.Cursor):
+    """Genre names plus a movie_genres junction table kept in sync with movies.genre by triggers."""
+    cursor.execute('''
+        CREATE TABLE genres (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE movie_genres (
+            movie_id INTEGER NOT NULL,
+            media_type TEXT NOT NULL,
+            genre_id INTEGER NOT NULL,
+            PRIMARY KEY (movie_id, media_type, genre_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX idx_movie_genres_genre ON movie_genres(genre_id)')
     
+    insert_new = f'''
+        INSERT OR IGNORE INTO movie_genres (movie_id, media_type, genre_id)
+        SELECT NEW.id, NEW.media_type, value FROM json_each({_GENRE_IDS_JSON.format("NEW.genre")});
+    '''
+    cursor.execute(f'''
+        CREATE TRIGGER movies_genres_insert AFTER INSERT ON movies BEGIN
+            {insert_new}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER movies_genres_update AFTER UPDATE OF genre ON movies
+        WHEN OLD.genre IS NOT NEW.genre BEGIN
+            DELETE FROM movie_genres WHERE movie_id = OLD.id AND media_type = OLD.media_type;
+            {insert_new}
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER movies_genres_delete AFTER DELETE ON movies BEGIN
+            DELETE FROM movie_genres WHERE movie_id = OLD.id AND media_type = OLD.media_type;
+        END
+    ''')
+    
+    # Backfill from rows cached before this migration
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO movie_genres (movie_id, media_type, genre_id)
+        SELECT m.id, m.media_type, j.value
+        FROM movies m, json_each({_GENRE_IDS_JSON.format("m.genre")}) j
+    ''')
+
+def _history_stats_sql(row: str, delta: int) -> str:
+    """Trigger statements that add (delta=1) or remove (delta=-1) one history row from the stats tables."""
+    sql = f'''
+        INSERT INTO stats_media (media_type, watched, rated, rating_sum)
+        VALUES ({row}.media_type, {delta}, {delta} * ({row}.rating IS NOT NULL), {delta} * COALESCE({row}.rating, 0))
+        ON CONFLICT (media_type) DO UPDATE SET
+            watched = watched + excluded.watched,
+            rated = rated + excluded.rated,
+            rating_sum = rating_sum + excluded.rating_sum;
+        INSERT INTO stats_ratings (bucket, watched)
+        SELECT MIN(MAX(CAST({row}.rating AS INTEGER), 0), 10), {delta} WHERE {row}.rating IS NOT NULL
+        ON CONFLICT (bucket) DO UPDATE SET watched = watched + excluded.watched;
+        INSERT INTO stats_months (month, watched)
+        VALUES (COALESCE(strftime('%Y-%m', {row}.watched_at), 'unknown'), {delta})
+        ON CONFLICT (month) DO UPDATE SET watched = watched + excluded.watched;
+        INSERT INTO stats_genres (genre_id, watched)
+        SELECT genre_id, {delta} FROM movie_genres
+        WHERE movie_id = {row}.movie_id AND media_type = {row}.media_type
+        ON CONFLICT (genre_id) DO UPDATE SET watched = watched + excluded.watched;
+    '''
+    if delta < 0:
+        sql += '''
+        DELETE FROM stats_ratings WHERE watched <= 0;
+        DELETE FROM stats_months WHERE watched <= 0;
+        DELETE FROM stats_genres WHERE watched <= 0;
+        '''
+    return sql
+
+def _migration_5_stats_aggregates(cursor: sqlite3.Cursor):
+    """Viewing stats maintained incrementally by triggers on history and movie_genres."""
     cursor.execute('''
-        INSERT INTO history (movie_id, rating, review, media_type)
-        VALUES (?, ?, ?, ?)
-    ''', (movie_id, rating, review, media_type))
-    conn.commit()
-    conn.close()
+        CREATE TABLE stats_media (
+            media_type TEXT PRIMARY KEY,
+            watched INTEGER NOT NULL,
+            rated INTEGER NOT NULL,
+            rating_sum REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE TABLE stats_genres (genre_id INTEGER PRIMARY KEY, watched INTEGER NOT NULL)')
+    cursor.execute('CREATE TABLE stats_ratings (bucket INTEGER PRIMARY KEY, watched INTEGER NOT NULL)')
+    cursor.execute('CREATE TABLE stats_months (month TEXT PRIMARY KEY, watched INTEGER NOT NULL)')
+    
+    cursor.execute(f'''
+        CREATE TRIGGER history_stats_insert AFTER INSERT ON history BEGIN
+            {_history_stats_sql("NEW", 1)}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER history_stats_delete AFTER DELETE ON history BEGIN
+            {_history_stats_sql("OLD", -1)}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER history_stats_update AFTER UPDATE OF movie_id, media_type, rating, watched_at ON history BEGIN
+            {_history_stats_sql("OLD", -1)}
+            {_history_stats_sql("NEW", 1)}
+        END
+    ''')
+    # A watched title whose genres change moves its count between genres
+    cursor.execute('''
+        CREATE TRIGGER movie_genres_stats_insert AFTER INSERT ON movie_genres
+        WHEN EXISTS (SELECT 1 FROM history WHERE movie_id = NEW.movie_id AND media_type = NEW.media_type) BEGIN
+            INSERT INTO stats_genres (genre_id, watched) VALUES (NEW.genre_id, 1)
+            ON CONFLICT (genre_id) DO UPDATE SET watched = watched + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER movie_genres_stats_delete AFTER DELETE ON movie_genres
+        WHEN EXISTS (SELECT 1 FROM history WHERE movie_id = OLD.movie_id AND media_type = OLD.media_type) BEGIN
+            UPDATE stats_genres SET watched = watched - 1 WHERE genre_id = OLD.genre_id;
+            DELETE FROM stats_genres WHERE watched <= 0;
+        END
+    ''')
+    
+    # Backfill from the existing history
+    cursor.execute('''
+        INSERT INTO stats_media (media_type, watched, rated, rating_sum)
+        SELECT media_type, COUNT(*), COUNT(rating), COALESCE(SUM(rating), 0) FROM history GROUP BY media_type
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_ratings (bucket, watched)
+        SELECT MIN(MAX(CAST(rating AS INTEGER), 0), 10) AS bucket, COUNT(*) FROM history
+        WHERE rating IS NOT NULL GROUP BY bucket
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_months (month, watched)
+        SELECT COALESCE(strftime('%Y-%m', watched_at), 'unknown') AS month, COUNT(*) FROM history GROUP BY month
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_genres (genre_id, watched)
+        SELECT mg.genre_id, COUNT(*) FROM history h
+        JOIN movie_genres mg ON mg.movie_id = h.movie_id AND mg.media_type = h.media_type
+        GROUP BY mg.genre_id
+    ''')
+
+def _migration_6_calendar_events(cursor: sqlite3.Cursor):
+    """Local mirror of CineMate-tagged calendar events plus the Calendar sync token."""
+    # start_time/end_time are UTC ISO strings ('...Z') so they sort and compare as text
+    cursor.execute('''
+        CREATE TABLE calendar_events (
+            event_id TEXT PRIMARY KEY,
+            kind TEXT,
+            title TEXT,
+            series TEXT,
+            summary TEXT,
+            description TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            link TEXT,
+            tags TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_calendar_events_start ON calendar_events(start_time)')
+    cursor.execute('''
+        CREATE TABLE calendar_sync (
+            calendar_id TEXT PRIMARY KEY,
+            sync_token TEXT,
+            synced_at REAL
+        )
+    ''')
+
+def _migration_7_tv_episodes(cursor: sqlite3.Cursor):
+    """Per-episode runtimes of TV shows, filled one season at a time."""
+    cursor.execute('''
+        CREATE TABLE tv_episodes (
+            show_id INTEGER NOT NULL,
+            season_number INTEGER NOT NULL,
+            episode_number INTEGER NOT NULL,
+            runtime INTEGER,
+            PRIMARY KEY (show_id, season_number, episode_number)
+        ) WITHOUT ROWID
+    ''')
+
+def _migration_8_binge_plans(cursor: sqlite3.Cursor):
+    """Persistent binge plans and their daily sessions."""
+    # Episodes are addressed by their position in the show's airing order (0-based);
+    # `watched` counts the episodes watched so far. Session `day` N starts at
+    # anchor_time + (N - anchor_day) days unless the plan is rescheduled.
+    cursor.execute('''
+        CREATE TABLE binge_plans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            show_id INTEGER NOT NULL,
+            show_name TEXT NOT NULL,
+            episodes_per_day INTEGER NOT NULL DEFAULT 0,
+            daily_minutes INTEGER NOT NULL DEFAULT 0,
+            watched INTEGER NOT NULL DEFAULT 0,
+            anchor_time TEXT NOT NULL,
+            anchor_day INTEGER NOT NULL DEFAULT 1,
+            status TEXT NOT NULL DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX idx_binge_plans_active ON binge_plans(show_id) WHERE status = 'active'")
+    cursor.execute('''
+        CREATE TABLE binge_sessions (
+            plan_id INTEGER NOT NULL REFERENCES binge_plans(id),
+            day INTEGER NOT NULL,
+            first_episode INTEGER NOT NULL,
+            last_episode INTEGER NOT NULL,
+            start_time TEXT NOT NULL,
+            duration_minutes INTEGER NOT NULL,
+            event_id TEXT,
+            PRIMARY KEY (plan_id, day)
+        ) WITHOUT ROWID
+    ''')
+
+# movies has a composite key, so its FTS rows are keyed by id * 2 + (media_type = 'tv')
+_MOVIE_FTS_KEY = "({0}.id * 2 + ({0}.media_type = 'tv'))"
+
+def _migration_9_movies_fts(cursor: sqlite3.Cursor):
+    """Trigram full-text index over cached titles and overviews (SQLite 3.34+)."""
+    cursor.execute("CREATE VIRTUAL TABLE movies_fts USING fts5(title, overview, tokenize = 'trigram')")
+    cursor.execute(f'''
+        CREATE TRIGGER movies_fts_insert AFTER INSERT ON movies BEGIN
+            INSERT INTO movies_fts (rowid, title, overview)
+            VALUES ({_MOVIE_FTS_KEY.format("NEW")}, NEW.title, NEW.overview);
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER movies_fts_delete AFTER DELETE ON movies BEGIN
+            DELETE FROM movies_fts WHERE rowid = {_MOVIE_FTS_KEY.format("OLD")};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER movies_fts_update AFTER UPDATE OF title, overview ON movies BEGIN
+            UPDATE movies_fts SET title = NEW.title, overview = NEW.overview
+            WHERE rowid = {_MOVIE_FTS_KEY.format("NEW")};
+        END
+    ''')
+    cursor.execute(f'''
+        INSERT INTO movies_fts (rowid, title, overview)
+        SELECT {_MOVIE_FTS_KEY.format("movies")}, title, overview FROM movies
+    ''')
+
+def _migration_10_keyset_indexes(cursor: sqlite3.Cursor):
+    """Covering indexes ordered like the keyset-paged listings (date, then id)."""
+    cursor.execute('DROP INDEX idx_history_watched_at')
+    cursor.execute('DROP INDEX idx_watchlist_added_at')
+    cursor.execute('''
+        CREATE INDEX idx_history_keyset
+        ON history(watched_at, id, movie_id, media_type, rating, review)
+    ''')
+    cursor.execute('CREATE INDEX idx_watchlist_keyset ON watchlist(added_at, id, movie_id, media_type)')
+
+def _migration_11_import_jobs(cursor: sqlite3.Cursor):
+    """Progress of file imports, so an interrupted import resumes where it stopped."""
+    # A job is tied to one version of a file (its size and mtime); rows_done counts the
+    # data rows already committed, imported/unresolved how they turned out.
+    cursor.execute('''
+        CREATE TABLE import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL,
+            target TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            file_mtime REAL NOT NULL,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            imported INTEGER NOT NULL DEFAULT 0,
+            unresolved INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'running',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX idx_import_jobs_running ON import_jobs(path, target) WHERE status = 'running'")
+
+def title_key(title: str) -> str:
+    """A title folded for exact lookups: case, accents and punctuation are ignored."""
+    text = unicodedata.normalize('NFKD', title.casefold())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+def _migration_12_movie_title_keys(cursor: sqlite3.Cursor):
+    """Folded titles (title_key()) of cached movies, for exact title lookups."""
+    cursor.execute('ALTER TABLE movies ADD COLUMN title_key TEXT')
+    rows = cursor.execute('SELECT rowid, title FROM movies').fetchall()
+    cursor.executemany('UPDATE movies SET title_key = ? WHERE rowid = ?', [(title_key(title), rowid) for rowid, title in rows])
+    cursor.execute('CREATE INDEX idx_movies_title_key ON movies(title_key)')
+
+MIGRATIONS = [
+    _migration_1_base_schema,
+    _migration_2_api_cache,
+    _migration_3_history_watchlist_indexes,
+    _migration_4_normalized_genres,
+    _migration_5_stats_aggregates,
+    _migration_6_calendar_events,
+    _migration_7_tv_episodes,
+    _migration_8_binge_plans,
+    _migration_9_movies_fts,
+    _migration_10_keyset_indexes,
+    _migration_11_import_jobs,
+    _migration_12_movie_title_keys,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def init_db():
+    """
+    Initialize the database, applying any migrations it has not seen yet.
+    Safe to call repeatedly: an up-to-date database costs a single PRAGMA read.
+    """
+    with connection() as conn:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        for number in range(version + 1, SCHEMA_VERSION + 1):
+            # One transaction per migration, so a failure keeps earlier upgrades
+            with transaction():
+                MIGRATIONS[number - 1](conn.cursor())
+                conn.execute(f'PRAGMA user_version = {number}')
+
+def add_movie_cache(movie_id: int, title: str, genre: str, release_date: str, overview: str, media_type: str = "movie"):
+    """Cache movie details to avoid repeated API calls."""
+    add_movies_cache_bulk([(movie_id, title, genre, release_date, overview, media_type)])
+
+def add_movies_cache_bulk(items: List[Tuple[int, str, str, str, str, str]]):
+    """
+    Cache many (id, title, genre, release_date, overview, media_type) rows in one transaction.
+    Rows identical to what is already cached are left untouched.
+    """
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO movies (id, title, genre, release_date, overview, media_type, title_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id, media_type) DO UPDATE SET
+                title = excluded.title,
+                title_key = excluded.title_key,
+                genre = excluded.genre,
+                release_date = excluded.release_date,
+                overview = excluded.overview
+            WHERE movies.title IS NOT excluded.title
+                OR movies.genre IS NOT excluded.genre
+                OR movies.release_date IS NOT excluded.release_date
+                OR movies.overview IS NOT excluded.overview
+        ''', [(*item, title_key(item[1])) for item in items])
+
+def get_movie_cache(movie_id: int, media_type: str = "movie") -> Optional[Tuple]:
+    """A cached title as an (id, media_type, title, release_date, overview, genre) row."""
+    with connection() as conn:
+        return conn.execute('''
+            SELECT id, media_type, title, release_date, overview, genre FROM movies
+            WHERE id = ? AND media_type = ?
+        ''', (movie_id, media_type)).fetchone()
+
+def find_movies_by_title(
+    title: str,
+    year: Optional[str] = None,
+    media_type: Optional[str] = None,
+    limit: int = 25,
+) -> List[Tuple]:
+    """
+    Cached titles whose title_key() equals that of `title`, as
+    (id, media_type, title, release_date, overview, genre) rows.
+    """
+    filters, params = '', []
+    if year:
+        filters += ' AND substr(release_date, 1, 4) = ?'
+        params.append(year)
+    if media_type:
+        filters += ' AND media_type = ?'
+        params.append(media_type)
+    with connection() as conn:
+        return conn.execute(f'''
+            SELECT id, media_type, title, release_date, overview, genre
+            FROM movies WHERE title_key = ? {filters} LIMIT ?
+        ''', [title_key(title), *params, limit]).fetchall()
+
+def save_genres(genres: Dict[int, str]):
+    """Store TMDB genre id -> name mappings."""
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO genres (id, name) VALUES (?, ?)
+            ON CONFLICT (id) DO UPDATE SET name = excluded.name WHERE name IS NOT excluded.name
+        ''', list(genres.items()))
+
+def get_genre_names() -> Dict[int, str]:
+    with connection() as conn:
+        return dict(conn.execute('SELECT id, name FROM genres').fetchall())
+
+def get_cached_response(key: str) -> Optional[Tuple[str, float]]:
+    """Return (json_value, expires_at) for a cached API response, or None."""
+    with connection() as conn:
+        return conn.execute('SELECT value, expires_at FROM api_cache WHERE key = ?', (key,)).fetchone()
+
+def set_cached_response(key: str, value: str, expires_at: float):
+    """Store an API response, evicting the soonest-expiring entries when the cache is full."""
+    global _api_cache_writes
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO api_cache (key, value, expires_at)
+            VALUES (?, ?, ?)
+        ''', (key, value, expires_at))
+        
+        _api_cache_writes += 1
+        if _api_cache_writes % API_CACHE_PRUNE_INTERVAL == 0:
+            cursor.execute('''
+                DELETE FROM api_cache WHERE key IN (
+                    SELECT key FROM api_cache ORDER BY expires_at
+                    LIMIT max((SELECT COUNT(*) FROM api_cache) - ?, 0)
+                )
+            ''', (API_CACHE_MAX_ENTRIES,))
+
+def get_season_episode_counts(show_id: int) -> Dict[int, int]:
+    """season_number -> number of cached episodes for a show."""
+    with connection() as conn:
+        return dict(conn.execute('''
+            SELECT season_number, COUNT(*) FROM tv_episodes WHERE show_id = ? GROUP BY season_number
+        ''', (show_id,)).fetchall())
+
+def save_season_episodes(show_id: int, season_number: int, episodes: List[Tuple[int, Optional[int]]]):
+    """Replace the cached (episode_number, runtime) rows of one season."""
+    with transaction() as conn:
+        conn.execute('DELETE FROM tv_episodes WHERE show_id = ? AND season_number = ?', (show_id, season_number))
+        conn.executemany('''
+            INSERT INTO tv_episodes (show_id, season_number, episode_number, runtime) VALUES (?, ?, ?, ?)
+        ''', [(show_id, season_number, number, runtime) for number, runtime in episodes])
+
+def get_show_episodes(show_id: int) -> List[Tuple[int, int, Optional[int]]]:
+    """Cached (season_number, episode_number, runtime) rows of a show in airing order."""
+    with connection() as conn:
+        return conn.execute('''
+            SELECT season_number, episode_number, runtime FROM tv_episodes
+            WHERE show_id = ? ORDER BY season_number, episode_number
+        ''', (show_id,)).fetchall()
+
+BINGE_PLAN_COLUMNS = ['id', 'show_id', 'show_name', 'episodes_per_day', 'daily_minutes', 'watched', 'anchor_time', 'anchor_day', 'status']
+
+def create_binge_plan(show_id: int, show_name: str, episodes_per_day: int, daily_minutes: int, anchor_time: str) -> Dict[str, Any]:
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO binge_plans (show_id, show_name, episodes_per_day, daily_minutes, anchor_time)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (show_id, show_name, episodes_per_day, daily_minutes, anchor_time))
+        plan_id = cursor.lastrowid
+    return get_binge_plan(plan_id)
+
+def get_binge_plan(plan_id: int) -> Optional[Dict[str, Any]]:
+    with connection() as conn:
+        row = conn.execute(f"SELECT {', '.join(BINGE_PLAN_COLUMNS)} FROM binge_plans WHERE id = ?", (plan_id,)).fetchone()
+    return dict(zip(BINGE_PLAN_COLUMNS, row)) if row else None
+
+def find_active_binge_plan(show_id: Optional[int] = None, show_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """The active plan for a show, by TMDB id or by (case-insensitive) show name."""
+    if show_id is not None:
+        where, param = 'show_id = ?', show_id
+    else:
+        where, param = 'show_name = ? COLLATE NOCASE', show_name
+    with connection() as conn:
+        row = conn.execute(f'''
+            SELECT {', '.join(BINGE_PLAN_COLUMNS)} FROM binge_plans WHERE status = 'active' AND {where}
+        ''', (param,)).fetchone()
+    return dict(zip(BINGE_PLAN_COLUMNS, row)) if row else None
+
+def save_binge_plan(plan: Dict[str, Any]):
+    """Write back the mutable fields of a plan returned by get_binge_plan."""
+    with transaction() as conn:
+        conn.execute('''
+            UPDATE binge_plans SET episodes_per_day = ?, daily_minutes = ?, watched = ?,
+                anchor_time = ?, anchor_day = ?, status = ?
+            WHERE id = ?
+        ''', (plan['episodes_per_day'], plan['daily_minutes'], plan['watched'],
+              plan['anchor_time'], plan['anchor_day'], plan['status'], plan['id']))
+
+def get_binge_sessions(plan_id: int) -> List[Tuple]:
+    """(day, first_episode, last_episode, start_time, duration_minutes, event_id) rows in day order."""
+    with connection() as conn:
+        return conn.execute('''
+            SELECT day, first_episode, last_episode, start_time, duration_minutes, event_id
+            FROM binge_sessions WHERE plan_id = ? ORDER BY day
+        ''', (plan_id,)).fetchall()
+
+def replace_binge_sessions(plan_id: int, from_day: int, sessions: List[Tuple]):
+    """Replace a plan's sessions from `from_day` on; earlier days are kept as they are."""
+    with transaction() as conn:
+        conn.execute('DELETE FROM binge_sessions WHERE plan_id = ? AND day >= ?', (plan_id, from_day))
+        conn.executemany('''
+            INSERT INTO binge_sessions (plan_id, day, first_episode, last_episode, start_time, duration_minutes, event_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(plan_id, *session) for session in sessions])
+
+def attach_binge_session_event(plan_id: int, session: Tuple, event_id: str) -> bool:
+    """
+    Record the event of a session whose create call finished late, if that session is
+    still laid out the same and has no event yet. Returns whether it was recorded.
+    """
+    day, first_episode, last_episode, start_time, duration_minutes = session[:5]
+    with transaction() as conn:
+        cursor = conn.execute('''
+            UPDATE binge_sessions SET event_id = ?
+            WHERE plan_id = ? AND day = ? AND first_episode = ? AND last_episode = ?
+                AND start_time = ? AND duration_minutes = ? AND event_id IS NULL
+        ''', (event_id, plan_id, day, first_episode, last_episode, start_time, duration_minutes))
+        return cursor.rowcount > 0
+
+CALENDAR_EVENT_COLUMNS = 'event_id, kind, title, series, summary, description, start_time, end_time, link, tags'
+
+def upsert_calendar_events(rows: List[Tuple]):
+    """Store (event_id, kind, title, series, summary, description, start_time, end_time, link, tags) rows."""
+    with transaction() as conn:
+        conn.executemany(f'''
+            INSERT OR REPLACE INTO calendar_events ({CALENDAR_EVENT_COLUMNS})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+def delete_calendar_events(event_ids: List[str]):
+    with transaction() as conn:
+        conn.executemany('DELETE FROM calendar_events WHERE event_id = ?', [(i,) for i in event_ids])
+
+def find_calendar_events(
+    text: Optional[str] = None,
+    kind: Optional[str] = None,
+    start_from: Optional[str] = None,
+    start_before: Optional[str] = None,
+    end_after: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[Tuple]:
+    """
+    Indexed events in start order. `text` matches the tagged title or the summary
+    (case-insensitive substring); the start/end bounds are UTC ISO strings, and
+    `end_after` keeps events still in progress (like the Calendar API's timeMin).
+    """
+    clauses, params = [], []
+    if text:
+        clauses.append("(instr(lower(title), lower(?)) > 0 OR instr(lower(summary), lower(?)) > 0)")
+        params += [text, text]
+    if kind:
+        clauses.append('kind = ?')
+        params.append(kind)
+    if start_from:
+        clauses.append('start_time >= ?')
+        params.append(start_from)
+    if start_before:
+        clauses.append('start_time < ?')
+        params.append(start_before)
+    if end_after:
+        clauses.append('end_time > ?')
+        params.append(end_after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    sql = f'SELECT {CALENDAR_EVENT_COLUMNS} FROM calendar_events {where} ORDER BY start_time'
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    with connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+def get_calendar_sync_token(calendar_id: str = 'primary') -> Optional[str]:
+    with connection() as conn:
+        row = conn.execute('SELECT sync_token FROM calendar_sync WHERE calendar_id = ?', (calendar_id,)).fetchone()
+        return row[0] if row else None
+
+def set_calendar_sync_token(sync_token: Optional[str], synced_at: float, calendar_id: str = 'primary'):
+    with transaction() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO calendar_sync (calendar_id, sync_token, synced_at) VALUES (?, ?, ?)
+        ''', (calendar_id, sync_token, synced_at))
+
+def reset_calendar_events(calendar_id: str = 'primary'):
+    """Forget every indexed event and the sync token, ahead of a full resync."""
+    with transaction() as conn:
+        conn.execute('DELETE FROM calendar_events')
+        conn.execute('DELETE FROM calendar_sync WHERE calendar_id = ?', (calendar_id,))
+
+HISTORY_UPSERT = '''
+    INSERT INTO history (movie_id, rating, review, media_type)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (movie_id, media_type) DO UPDATE SET
+        rating = excluded.rating,
+        review = excluded.review,
+        watched_at = CURRENT_TIMESTAMP
+'''
+
+def add_to_history(movie_id: int, rating: float, review: str, media_type: str = "movie"):
+    with transaction() as conn:
+        # One entry per title: logging it again replaces the rating, review and date
+        conn.execute(HISTORY_UPSERT, (movie_id, rating, review, media_type))
+
+def log_history_batch(items: List[Tuple[int, float, str, str]]):
+    """
+    Log several (movie_id, rating, review, media_type) entries in one transaction.
+    Each entry replaces any earlier history row for that title and drops it from the watchlist.
+    """
+    keys = [(movie_id, media_type) for movie_id, _, _, media_type in items]
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(HISTORY_UPSERT, items)
+        cursor.executemany('DELETE FROM watchlist WHERE movie_id = ? AND media_type = ?', keys)
 
 def delete_from_history(movie_id: int, media_type: str = "movie"):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM history WHERE movie_id = ? AND media_type = ?', (movie_id, media_type))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM history WHERE movie_id = ? AND media_type = ?', (movie_id, media_type))
 
 def add_to_watchlist(movie_id: int, media_type: str = "movie"):
-    conn = get_connection()
-    cursor = conn.cursor()
-    # Check if already in watchlist
-    cursor.execute('SELECT id FROM watchlist WHERE movie_id = ? AND media_type = ?', (movie_id, media_type))
-    if cursor.fetchone():
-        conn.close()
-        return False
-        
-    cursor.execute('''
-        INSERT INTO watchlist (movie_id, media_type)
-        VALUES (?, ?)
-    ''', (movie_id, media_type))
-    conn.commit()
-    conn.close()
-    return True
+    # Returns False if it was already in the watchlist
+    return add_to_watchlist_batch([(movie_id, media_type)])[0]
+
+def add_to_watchlist_batch(items: List[Tuple[int, str]]) -> List[bool]:
+    """
+    Add several (movie_id, media_type) entries in one transaction.
+    Returns, per entry, True if it was added and False if it was already there.
+    """
+    with transaction() as conn:
+        cursor = conn.cursor()
+        added = []
+        for movie_id, media_type in items:
+            cursor.execute('''
+                INSERT OR IGNORE INTO watchlist (movie_id, media_type)
+                VALUES (?, ?)
+            ''', (movie_id, media_type))
+            added.append(cursor.rowcount == 1)
+        return added
 
 def remove_from_watchlist(movie_id: int, media_type: str = "movie"):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM watchlist WHERE movie_id = ? AND media_type = ?', (movie_id, media_type))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM watchlist WHERE movie_id = ? AND media_type = ?', (movie_id, media_type))
 
-def get_history() -> List[Tuple]:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT m.title, h.rating, h.review, h.watched_at, h.media_type
+IMPORT_JOB_COLUMNS = ['id', 'path', 'target', 'file_size', 'file_mtime', 'rows_done', 'imported', 'unresolved', 'status']
+
+def start_import_job(path: str, target: str, file_size: int, file_mtime: float) -> Dict[str, Any]:
+    """
+    The running import of this file into `target`, or a new one. A running job for an
+    older version of the file is abandoned, since its row count no longer applies.
+    """
+    with transaction() as conn:
+        row = conn.execute(f'''
+            SELECT {', '.join(IMPORT_JOB_COLUMNS)} FROM import_jobs
+            WHERE path = ? AND target = ? AND status = 'running'
+        ''', (path, target)).fetchone()
+        if row:
+            job = dict(zip(IMPORT_JOB_COLUMNS, row))
+            if job['file_size'] == file_size and job['file_mtime'] == file_mtime:
+                return job
+            conn.execute("UPDATE import_jobs SET status = 'abandoned' WHERE id = ?", (job['id'],))
+        cursor = conn.execute('''
+            INSERT INTO import_jobs (path, target, file_size, file_mtime) VALUES (?, ?, ?, ?)
+        ''', (path, target, file_size, file_mtime))
+        return dict(zip(IMPORT_JOB_COLUMNS, (cursor.lastrowid, path, target, file_size, file_mtime, 0, 0, 0, 'running')))
+
+# Imported entries keep their own date; an older entry never replaces a newer one
+HISTORY_IMPORT_UPSERT = '''
+    INSERT INTO history (movie_id, rating, review, media_type, watched_at)
+    VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+    ON CONFLICT (movie_id, media_type) DO UPDATE SET
+        rating = excluded.rating,
+        review = excluded.review,
+        watched_at = excluded.watched_at
+    WHERE excluded.watched_at >= history.watched_at
+'''
+
+def save_import_batch(job: Dict[str, Any], rows_read: int, movies: List[Tuple], items: List[Tuple], unresolved: int):
+    """
+    Commit one batch of an import together with the job's progress, so a resumed job
+    never writes a row twice. `movies` are add_movies_cache_bulk rows; `items` are
+    (movie_id, rating, review, media_type, watched_at) for history, or
+    (movie_id, media_type, added_at) for the watchlist. Updates `job` in place.
+    """
+    with transaction() as conn:
+        add_movies_cache_bulk(movies)
+        cursor = conn.cursor()
+        if job['target'] == 'history':
+            cursor.executemany(HISTORY_IMPORT_UPSERT, items)
+            cursor.executemany(
+                'DELETE FROM watchlist WHERE movie_id = ? AND media_type = ?',
+                [(movie_id, media_type) for movie_id, _, _, media_type, _ in items],
+            )
+        else:
+            cursor.executemany('''
+                INSERT OR IGNORE INTO watchlist (movie_id, media_type, added_at)
+                VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ''', items)
+        job['rows_done'] += rows_read
+        job['imported'] += len(items)
+        job['unresolved'] += unresolved
+        cursor.execute('''
+            UPDATE import_jobs SET rows_done = ?, imported = ?, unresolved = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (job['rows_done'], job['imported'], job['unresolved'], job['id']))
+
+def finish_import_job(job: Dict[str, Any]):
+    with transaction() as conn:
+        conn.execute("UPDATE import_jobs SET status = 'done', updated_at = CURRENT_TIMESTAMP WHERE id = ?", (job['id'],))
+    job['status'] = 'done'
+
+# --- Keyset-paged listings ---
+# Pages run newest first on (date, id). A cursor is the (date, id) of the last row of the
+# previous page, so every page is an index range scan no matter how deep it is.
+
+def _date_filters(column: str, date_from: Optional[str], date_to: Optional[str]) -> Tuple[List[str], List[Any]]:
+    """Inclusive YYYY-MM-DD bounds on a timestamp column."""
+    clauses, params = [], []
+    if date_from:
+        clauses.append(f'{column} >= ?')
+        params.append(date_from)
+    if date_to:
+        clauses.append(f"{column} < date(?, '+1 day')")
+        params.append(date_to)
+    return clauses, params
+
+def _keyset_page(sql: str, clauses: List[str], params: List[Any], order: Tuple[str, str],
+                 cursor: Optional[Tuple[Any, int]], limit: int, descending: bool = True) -> List[Tuple]:
+    direction, compare = ('DESC', '<') if descending else ('ASC', '>')
+    if cursor:
+        clauses = clauses + [f'({order[0]}, {order[1]}) {compare} (?, ?)']
+        params = params + list(cursor)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    with connection() as conn:
+        return conn.execute(
+            f'{sql} {where} ORDER BY {order[0]} {direction}, {order[1]} {direction} LIMIT ?', params + [limit]
+        ).fetchall()
+
+def get_history_page(
+    limit: int = 50,
+    cursor: Optional[Tuple[str, int]] = None,
+    media_type: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    max_rating: Optional[float] = None,
+    watched_from: Optional[str] = None,
+    watched_to: Optional[str] = None,
+) -> List[Tuple]:
+    """
+    One page of history, newest first, as (title, rating, review, watched_at, media_type,
+    movie_id, id) rows. Pass the (watched_at, id) of the last row as `cursor` to get the next page.
+    """
+    clauses, params = _date_filters('h.watched_at', watched_from, watched_to)
+    if media_type:
+        clauses.append('h.media_type = ?')
+        params.append(media_type)
+    if min_rating is not None:
+        clauses.append('h.rating >= ?')
+        params.append(min_rating)
+    if max_rating is not None:
+        clauses.append('h.rating <= ?')
+        params.append(max_rating)
+    return _keyset_page('''
+        SELECT m.title, h.rating, h.review, h.watched_at, h.media_type, h.movie_id, h.id
         FROM history h
         LEFT JOIN movies m ON h.movie_id = m.id AND h.media_type = m.media_type
-        ORDER BY h.watched_at DESC
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    ''', clauses, params, ('h.watched_at', 'h.id'), cursor, limit)
 
-def get_watchlist() -> List[Tuple]:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT m.title, m.genre, m.release_date, w.added_at, w.media_type
+def get_watchlist_page(
+    limit: int = 50,
+    cursor: Optional[Tuple[str, int]] = None,
+    media_type: Optional[str] = None,
+    added_from: Optional[str] = None,
+    added_to: Optional[str] = None,
+) -> List[Tuple]:
+    """
+    One page of the watchlist, newest first, as (title, genres, release_date, added_at,
+    media_type, movie_id, id) rows. Pass the (added_at, id) of the last row as `cursor` for the next page.
+    """
+    clauses, params = _date_filters('w.added_at', added_from, added_to)
+    if media_type:
+        clauses.append('w.media_type = ?')
+        params.append(media_type)
+    return _keyset_page('''
+        SELECT m.title,
+               COALESCE((
+                   SELECT group_concat(g.name, ', ')
+                   FROM movie_genres mg JOIN genres g ON g.id = mg.genre_id
+                   WHERE mg.movie_id = w.movie_id AND mg.media_type = w.media_type
+               ), m.genre),
+               m.release_date, w.added_at, w.media_type, w.movie_id, w.id
         FROM watchlist w
         LEFT JOIN movies m ON w.movie_id = m.id AND w.media_type = m.media_type
-        ORDER BY w.added_at DESC
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    ''', clauses, params, ('w.added_at', 'w.id'), cursor, limit)
+
+# Sort keys accepted by query_history: name -> (SQL expression, cursor value type)
+HISTORY_SORT_KEYS = {
+    'watched_at': ('h.watched_at', str),
+    'rating': ('IFNULL(h.rating, 0)', float),
+    'title': ("IFNULL(m.title, '')", str),
+    'release_date': ("IFNULL(m.release_date, '')", str),
+}
+
+def query_history(
+    limit: int = 20,
+    cursor: Optional[Tuple[Any, int]] = None,
+    sort: str = 'watched_at',
+    descending: bool = True,
+    genre_ids: Optional[List[int]] = None,
+    text: Optional[str] = None,
+    media_type: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    max_rating: Optional[float] = None,
+    watched_from: Optional[str] = None,
+    watched_to: Optional[str] = None,
+) -> List[Tuple]:
+    """
+    Filtered, sorted page of history as (title, rating, review, watched_at, media_type,
+    genres, sort_value, id) rows. `genre_ids` keeps entries in any of those genres; `text`
+    matches the title (through the trigram index) or the review. Pass the (sort_value, id)
+    of the last row as `cursor` to get the next page.
+    """
+    if sort not in HISTORY_SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    sort_expr, sort_type = HISTORY_SORT_KEYS[sort]
+    if cursor:
+        cursor = (sort_type(cursor[0]), cursor[1])
+    
+    clauses, params = _date_filters('h.watched_at', watched_from, watched_to)
+    if media_type:
+        clauses.append('h.media_type = ?')
+        params.append(media_type)
+    if min_rating is not None:
+        clauses.append('h.rating >= ?')
+        params.append(min_rating)
+    if max_rating is not None:
+        clauses.append('h.rating <= ?')
+        params.append(max_rating)
+    if genre_ids:
+        clauses.append(f'''EXISTS (
+            SELECT 1 FROM movie_genres mg
+            WHERE mg.movie_id = h.movie_id AND mg.media_type = h.media_type
+              AND mg.genre_id IN ({', '.join('?' * len(genre_ids))})
+        )''')
+        params.extend(genre_ids)
+    if text:
+        pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        if len(text) < 3:
+            clauses.append("(m.title LIKE ? ESCAPE '\\' OR h.review LIKE ? ESCAPE '\\')")
+            params.extend([pattern, pattern])
+        else:
+            clauses.append('''((h.movie_id * 2 + (h.media_type = 'tv')) IN (
+                SELECT rowid FROM movies_fts WHERE movies_fts MATCH ?
+            ) OR h.review LIKE ? ESCAPE '\\')''')
+            params.extend(['title : "' + text.replace('"', '""') + '"', pattern])
+    
+    return _keyset_page(f'''
+        SELECT m.title, h.rating, h.review, h.watched_at, h.media_type,
+               COALESCE((
+                   SELECT group_concat(g.name, ', ')
+                   FROM movie_genres mg JOIN genres g ON g.id = mg.genre_id
+                   WHERE mg.movie_id = h.movie_id AND mg.media_type = h.media_type
+               ), ''),
+               {sort_expr}, h.id
+        FROM history h
+        LEFT JOIN movies m ON h.movie_id = m.id AND h.media_type = m.media_type
+    ''', clauses, params, (sort_expr, 'h.id'), cursor, limit, descending)
+
+def _iter_pages(get_page: Callable[..., List[Tuple]], batch_size: int, filters: Dict[str, Any]) -> Iterator[Tuple]:
+    cursor = None
+    while True:
+        rows = get_page(batch_size, cursor, **filters)
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        cursor = (rows[-1][3], rows[-1][-1])
+
+def iter_history(batch_size: int = 500, **filters) -> Iterator[Tuple]:
+    """
+    Stream every history row matching get_history_page's filters, newest first.
+    Rows are read a batch at a time, so the connection is never held between batches.
+    """
+    return _iter_pages(get_history_page, batch_size, filters)
+
+def iter_watchlist(batch_size: int = 500, **filters) -> Iterator[Tuple]:
+    """Stream every watchlist row matching get_watchlist_page's filters, newest first."""
+    return _iter_pages(get_watchlist_page, batch_size, filters)
 
 def clear_history():
     """Clear all entries from watch history."""
-    conn = get_connection()
-    conn.execute("DELETE FROM history")
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM history")
 
 def clear_watchlist():
     """Clear all entries from watchlist."""
-    conn = get_connection()
-    conn.execute("DELETE FROM watchlist")
-    conn.commit()
-    conn.close()
-
-def get_user_stats() -> Dict[str, Any]:
-    """Calculate user viewing statistics."""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with transaction() as conn:
+        conn.execute("DELETE FROM watchlist")
+
+def get_user_stats(top_n: int = 3, months: int = 12) -> Dict[str, Any]:
+    """
+    Read the viewing statistics kept up to date by the history triggers.
+    Cost does not depend on how long the history is.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        media = cursor.execute('SELECT media_type, watched, rated, rating_sum FROM stats_media').fetchall()
+        top_genres = cursor.execute(
+            'SELECT genre_id, watched FROM stats_genres ORDER BY watched DESC LIMIT ?', (top_n,)
+        ).fetchall()
+        ratings = cursor.execute('SELECT bucket, watched FROM stats_ratings ORDER BY bucket').fetchall()
+        per_month = cursor.execute(
+            'SELECT month, watched FROM stats_months ORDER BY month DESC LIMIT ?', (months,)
+        ).fetchall()
     
     stats = {}
+    stats['total_watched'] = sum(row[1] for row in media)
+    stats['by_media_type'] = {media_type: watched for media_type, watched, _, _ in media if watched}
     
-    # 1. Total watched
-    cursor.execute('SELECT COUNT(*) FROM history')
-    stats['total_watched'] = cursor.fetchone()[0]
-    
-    # 2. Average rating given
-    cursor.execute('SELECT AVG(rating) FROM history')
-    avg_rating = cursor.fetchone()[0]
-    stats['avg_rating'] = round(avg_rating, 1) if avg_rating else 0
-    
-    # 3. Favorite Genre
-    cursor.execute('''
-        SELECT m.genre 
-        FROM history h
-        JOIN movies m ON h.movie_id = m.id AND h.media_type = m.media_type
-    ''')
-    rows = cursor.fetchall()
-    
-    from collections import Counter
+    rated = sum(row[2] for row in media)
+    stats['avg_rating'] = round(sum(row[3] for row in media) / rated, 1) if rated else 0
     
-    all_genre_ids = []
-    for r in rows:
-        if r[0]:
-            ids = [x.strip() for x in r[0].split(",") if x.strip().isdigit()]
-            all_genre_ids.extend(ids)
-            
-    if all_genre_ids:
-        most_common = Counter(all_genre_ids).most_common(1)
-        stats['favorite_genre_id'] = int(most_common[0][0])
-        stats['favorite_genre_count'] = most_common[0][1]
-    else:
-        stats['favorite_genre_id'] = None
-        stats['favorite_genre_count'] = 0
-        
-    conn.close()
+    stats['top_genres'] = top_genres
+    stats['favorite_genre_id'] = top_genres[0][0] if top_genres else None
+    stats['favorite_genre_count'] = top_genres[0][1] if top_genres else 0
+    stats['rating_histogram'] = dict(ratings)
+    stats['watched_per_month'] = per_month[::-1]
     return stats
 
 if __name__ == "__main__":
@@ -1,12 +1,34 @@
-from fastmcp import FastMCP
+import asyncio
+from contextlib import asynccontextmanager
+from fastmcp import FastMCP, Context
 from core import database
 from services import cine_service
 from services import binge_service
+from services import movie_service
+from services import calendar_service
+from services import calendar_async
+from services import import_service
+from services import time_parser
 
 # Initialize database
 database.init_db()
 
-mcp = FastMCP("CineMate")
+@asynccontextmanager
+async def lifespan(server):
+    """Open shared resources when the server starts and release them on shutdown."""
+    await movie_service.start_client()
+    # Importing the Google client and parsing its discovery document takes a while;
+    # do it in the background so the server answers straight away
+    warm_up = asyncio.ensure_future(asyncio.to_thread(calendar_service.load_discovery_document))
+    try:
+        yield
+    finally:
+        await asyncio.gather(warm_up, return_exceptions=True)
+        await movie_service.close_client()
+        calendar_async.shutdown()
+        database.close_connection()
+
+mcp = FastMCP("CineMate", lifespan=lifespan)
 
 @mcp.tool()
 async def search_movies(query: str) -> str:
@@ -64,16 +86,45 @@ async def reschedule_movie(title: str, new_time_str: str) -> str:
         return f"Error rescheduling: {e}"
 
 @mcp.tool()
-async def schedule_binge(title: str, episodes_per_day: int, start_time_str: str) -> str:
+async def schedule_binge(title: str, episodes_per_day: int, start_time_str: str, daily_minutes: int = 0) -> str:
     """
     Schedule a binge-watching plan for a TV show.
-    Calculates how long it will take and creates calendar events.
+    Calculates how long it will take from real episode runtimes and creates calendar events.
+    Set daily_minutes to fill each day up to a time budget instead of a fixed episodes_per_day.
     """
     try:
-        return await binge_service.plan_and_schedule_binge(title, episodes_per_day, start_time_str)
+        return await binge_service.plan_and_schedule_binge(title, episodes_per_day, start_time_str, daily_minutes)
     except Exception as e:
         return f"Error scheduling binge: {e}"
 
+@mcp.tool()
+async def mark_binge_watched(title: str, episode: str = "") -> str:
+    """
+    Record progress on a binge plan and replan the remaining sessions.
+    episode is the last one watched (e.g. 'S02E05' or a count like '12'); leave it empty
+    if the next planned session was watched.
+    """
+    try:
+        return await binge_service.mark_binge_watched(title, episode)
+    except Exception as e:
+        return f"Error updating binge progress: {e}"
+
+@mcp.tool()
+async def reschedule_binge(title: str, start_time_str: str, episodes_per_day: int = 0, daily_minutes: int = 0) -> str:
+    """Move the remaining sessions of a binge plan to a new start time, optionally at a new pace."""
+    try:
+        return await binge_service.reschedule_binge(title, start_time_str, episodes_per_day, daily_minutes)
+    except Exception as e:
+        return f"Error rescheduling binge: {e}"
+
+@mcp.tool()
+async def continue_binge(title: str) -> str:
+    """Show binge progress and schedule the next sessions, including newly released episodes."""
+    try:
+        return await binge_service.continue_binge(title)
+    except Exception as e:
+        return f"Error continuing binge: {e}"
+
 @mcp.tool()
 async def cancel_movie(titles: str) -> str:
     """Cancel (delete) one or more scheduled events (comma-separated)."""
@@ -108,38 +159,121 @@ async def cancel_period(start_date: str, end_date: str = None) -> str:
     return await cine_service.cancel_events_in_range(start_date, end_date)
 
 @mcp.resource("cinemate://history")
-def get_history_resource() -> str:
-    """Get the user's watch history."""
-    history = database.get_history()
-    if not history:
-        return "History is empty."
-    
-    output = "Watch History:\n"
-    for title, rating, review, watched_at, media_type in history:
-        output += f"- [{media_type.upper()}] {title} ({rating}/10): {review} [Watched: {watched_at}]\n"
-    return output
+async def get_history_resource() -> str:
+    """Get the most recent entries of the user's watch history (use get_watch_history to page further)."""
+    return await cine_service.get_history_logic()
 
 @mcp.resource("cinemate://watchlist")
-def get_watchlist_resource() -> str:
-    """Get the user's watchlist."""
-    watchlist = database.get_watchlist()
-    if not watchlist:
-        return "Watchlist is empty."
-    
-    output = "Watchlist:\n"
-    for title, genre, release, added_at, media_type in watchlist:
-        output += f"- [{media_type.upper()}] {title} ({genre}) [Added: {added_at}]\n"
+async def get_watchlist_resource() -> str:
+    """Get the most recent entries of the user's watchlist (use get_watchlist to page further)."""
+    return await cine_service.get_watchlist_logic()
+
+@mcp.resource("cinemate://diagnostics")
+def get_diagnostics_resource() -> str:
+    """Get internal performance counters (TMDB pool, retries, search memo, title and time parsing)."""
+    sections = {
+        "TMDB Connection Pool": movie_service.get_pool_stats(),
+        "Search Memo": movie_service.get_search_memo_stats(),
+        "TMDB Requests": movie_service.get_retry_stats(),
+        "Title Resolution": movie_service.get_resolve_stats(),
+        "Time Parsing": time_parser.get_parse_stats(),
+    }
+    output = ""
+    for name, stats in sections.items():
+        output += f"{name}:\n"
+        for key, value in stats.items():
+            output += f"- {key}: {value}\n"
     return output
 
 @mcp.tool()
-async def get_watch_history() -> str:
-    """List all movies and TV shows in your watch history."""
-    return await cine_service.get_history_logic()
+async def get_watch_history(
+    limit: int = 20,
+    cursor: str = "",
+    media_type: str = "",
+    min_rating: float = None,
+    max_rating: float = None,
+    watched_from: str = "",
+    watched_to: str = "",
+) -> str:
+    """
+    List your watch history, newest first, one page at a time.
+    Optional filters: media_type ('movie'/'tv'), rating range, and watched_from/watched_to
+    dates (YYYY-MM-DD). Pass the cursor printed at the end of a page to get the next one.
+    """
+    return await cine_service.get_history_logic(limit, cursor, media_type, min_rating, max_rating, watched_from, watched_to)
 
 @mcp.tool()
-async def get_watchlist() -> str:
-    """List all movies and TV shows in your watchlist."""
-    return await cine_service.get_watchlist_logic()
+async def get_watchlist(
+    limit: int = 20,
+    cursor: str = "",
+    media_type: str = "",
+    added_from: str = "",
+    added_to: str = "",
+) -> str:
+    """
+    List your watchlist, newest first, one page at a time.
+    Optional filters: media_type ('movie'/'tv') and added_from/added_to dates (YYYY-MM-DD).
+    Pass the cursor printed at the end of a page to get the next one.
+    """
+    return await cine_service.get_watchlist_logic(limit, cursor, media_type, added_from, added_to)
+
+@mcp.tool()
+async def query_history(
+    genre: str = "",
+    min_rating: float = None,
+    max_rating: float = None,
+    media_type: str = "",
+    watched_from: str = "",
+    watched_to: str = "",
+    text: str = "",
+    sort: str = "watched_at",
+    order: str = "desc",
+    limit: int = 20,
+    cursor: str = "",
+) -> str:
+    """
+    Answer questions about your watch history (e.g. "sci-fi rated above 8 last year")
+    without listing all of it. Every filter is optional:
+    - genre: a genre name such as 'Science Fiction', 'sci-fi' or 'Comedy'
+    - min_rating / max_rating, media_type ('movie'/'tv'), watched_from / watched_to (YYYY-MM-DD)
+    - text: matched against titles and reviews
+    sort is one of watched_at, rating, title, release_date; order is 'asc' or 'desc'.
+    Pass the cursor printed at the end of a page to get the next one.
+    """
+    try:
+        return await cine_service.query_history_logic(
+            genre, min_rating, max_rating, media_type, watched_from, watched_to, text, sort, order, limit, cursor
+        )
+    except Exception as e:
+        return f"Error querying history: {e}"
+
+@mcp.tool()
+async def import_file(path: str, ctx: Context, target: str = "history", format: str = "") -> str:
+    """
+    Import a Letterboxd, IMDb or CineMate export (CSV or JSONL) into your history or watchlist.
+    target is 'history' or 'watchlist'; format is taken from the file extension unless given.
+    Large files are imported in batches with progress updates; if an import stops part way,
+    running it again on the same file resumes where it left off.
+    """
+    async def progress(rows_done: int, message: str):
+        await ctx.report_progress(rows_done, message=message)
+
+    try:
+        return await import_service.import_file(path, target, format, progress)
+    except Exception as e:
+        return f"Error importing: {e}"
+
+@mcp.tool()
+async def export_file(path: str, target: str = "history", format: str = "") -> str:
+    """
+    Export your history or watchlist to a CSV or JSONL file (format from the extension unless given).
+    The file can be imported again with import_file.
+    """
+    try:
+        count = await asyncio.to_thread(import_service.export_file, path, target, format)
+    except Exception as e:
+        return f"Error exporting: {e}"
+    return f"Exported {count} {target} entries to {path}."
 
 @mcp.tool()
 async def clear_watch_history() -> str:
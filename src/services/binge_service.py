@@ -1,109 +1,385 @@
-import math
+import re
+import asyncio
 import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from core import database
 from services import movie_service
-from services import calendar_service
-import dateparser
-from tzlocal import get_localzone_name
+from services import calendar_async
+from services import event_index
+from services import time_parser
 
-async def plan_and_schedule_binge(title: str, episodes_per_day: int, start_time_str: str) -> str:
+# Upcoming sessions kept on the calendar; later ones are added as the plan rolls forward
+BINGE_WINDOW = 14
+
+def _pack_sessions(episodes: list, episodes_per_day: int = 0, daily_minutes: int = 0) -> list:
     """
-    Core logic for calculating and scheduling a binge plan.
+    Split (season, episode, runtime) tuples into daily sessions: either a fixed number of
+    episodes, or as many as fit in daily_minutes (always at least one per session).
     """
-    # 1. Find the show
-    results = await movie_service.search_movies(title)
+    sessions = []
+    current, minutes = [], 0
+    for episode in episodes:
+        runtime = episode[2]
+        if daily_minutes > 0:
+            full = current and minutes + runtime > daily_minutes
+        else:
+            full = len(current) >= episodes_per_day
+        if full:
+            sessions.append(current)
+            current, minutes = [], 0
+        current.append(episode)
+        minutes += runtime
+    if current:
+        sessions.append(current)
+    return sessions
+
+def _episode_label(season: int, episode: int) -> str:
+    return f"S{season:02d}E{episode:02d}"
+
+async def _find_show(title: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Look up a TV show. Returns (show, error message)."""
+    results = await movie_service.resolve_title(title, media_type='tv')
     tv_results = [r for r in results if r.get('media_type') == 'tv']
-    
+
     if not tv_results:
         if results:
-            return f"Found '{results[0].get('title')}' but it seems to be a movie. Binge calculator is for TV shows."
-        return f"Could not find TV show '{title}'."
-        
-    show = tv_results[0]
-    show_id = show['id']
-    show_name = show['name']
-    
-    # 2. Get details
-    details = await movie_service.get_movie_details(show_id, "tv")
-    total_episodes = details.get('number_of_episodes', 0)
-    runtimes = details.get('episode_run_time', [])
-    avg_runtime = runtimes[0] if runtimes else 45
-    
-    if total_episodes == 0:
-        return f"Could not determine episode count for '{show_name}'."
-        
-    # 3. Calculate Plan
-    days_needed = math.ceil(total_episodes / episodes_per_day)
-    daily_duration = avg_runtime * episodes_per_day
-    
-    # 4. Parse Start Time
-    local_tz = get_localzone_name()
-    start_time = dateparser.parse(
-        start_time_str, 
-        settings={'PREFER_DATES_FROM': 'future', 'TIMEZONE': local_tz, 'RETURN_AS_TIMEZONE_AWARE': True}
+            return None, f"Found '{results[0].get('title')}' but it seems to be a movie. Binge calculator is for TV shows."
+        return None, f"Could not find TV show '{title}'."
+    return tv_results[0], ""
+
+async def _find_plan(title: str) -> Optional[Dict[str, Any]]:
+    """The active plan for a show, matched by name locally before asking TMDB."""
+    plan = database.find_active_binge_plan(show_name=title)
+    if plan:
+        return plan
+    show, _ = await _find_show(title)
+    return database.find_active_binge_plan(show_id=show['id']) if show else None
+
+async def _load_episodes(show_id: int) -> List[Tuple[int, int, int]]:
+    """Every episode of a show with its runtime (see movie_service.get_episode_runtimes)."""
+    details = await movie_service.get_title_bundle(show_id, "tv")
+    episodes = await movie_service.get_episode_runtimes(show_id, details)
+    if not episodes:
+        # No season data: assume the advertised episode count at the typical runtime
+        runtimes = details.get('episode_run_time') or [movie_service.DEFAULT_EPISODE_RUNTIME]
+        episodes = [(1, number, runtimes[0]) for number in range(1, details.get('number_of_episodes', 0) + 1)]
+    return episodes
+
+def _session_event(plan: Dict[str, Any], episodes: list, session: list) -> Dict[str, Any]:
+    day, first, last, start_time, duration, _ = session
+    return {
+        'summary': f"Binge {plan['show_name']} (Day {day})",
+        'description': (
+            f"Watching {_episode_label(*episodes[first][:2])}-{_episode_label(*episodes[last][:2])} "
+            f"({last - first + 1} episodes)."
+        ),
+        'start_time': datetime.datetime.fromisoformat(start_time),
+        'duration_minutes': duration,
+        'tags': {'kind': 'binge', 'title': plan['show_name'], 'series': plan['show_name'],
+                 'tmdb_id': plan['show_id'], 'day': day},
+    }
+
+# Pending _late_creates work
+_late_tasks: set = set()
+
+def _late_creates(plan_id: int, creates: List[Tuple], saved: asyncio.Event):
+    """
+    Callback for a create batch that timed out: once _replan has saved its sessions
+    (`saved`), the events the batch still made are attached to them, so the next pass
+    does not create them again. An event whose session changed meanwhile is deleted.
+    """
+    async def record(results: List[Dict[str, Any]]):
+        await saved.wait()
+        stray = [
+            result['id'] for session, result in zip(creates, results)
+            if result['ok'] and not database.attach_binge_session_event(plan_id, session, result['id'])
+        ]
+        if stray:
+            try:
+                await calendar_async.delete_events_batch(stray)
+            except Exception as e:
+                print(f"Warning: could not delete {len(stray)} duplicate binge events: {e}")
+
+    def on_late_result(results: List[Dict[str, Any]]):
+        task = asyncio.ensure_future(record(results))
+        # The loop only keeps weak references to tasks
+        _late_tasks.add(task)
+        task.add_done_callback(_late_tasks.discard)
+    return on_late_result
+
+async def _replan(
+    plan: Dict[str, Any],
+    episodes: list,
+    start_time: Optional[datetime.datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Lay out the plan's unwatched episodes as daily sessions and bring the calendar in line
+    with the first BINGE_WINDOW of them. Sessions that already started are left alone, and
+    only the events that actually differ are created, updated or deleted.
+    Saves the plan and its sessions and returns what changed. If a calendar batch fails,
+    what the other batches did is saved first and the error is then raised.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    existing = database.get_binge_sessions(plan['id'])
+    upcoming = [s for s in existing if datetime.datetime.fromisoformat(s[3]) >= now]
+    started = len(existing) - len(upcoming)
+    next_day = existing[started - 1][0] + 1 if started else 1
+
+    if start_time is None:
+        start_time = datetime.datetime.fromisoformat(plan['anchor_time'])
+        start_time += datetime.timedelta(days=next_day - plan['anchor_day'])
+        # Missed days roll forward instead of landing in the past
+        while start_time < now:
+            start_time += datetime.timedelta(days=1)
+
+    sessions = []
+    index = plan['watched']
+    packed = _pack_sessions(episodes[index:], plan['episodes_per_day'], plan['daily_minutes'])
+    for offset, session in enumerate(packed):
+        start = start_time + datetime.timedelta(days=offset)
+        duration = sum(runtime for _, _, runtime in session)
+        sessions.append([next_day + offset, index, index + len(session) - 1, start.isoformat(), duration, None])
+        index += len(session)
+
+    # Diff the window against what is on the calendar
+    old_sessions = {s[0]: s for s in upcoming}
+    previous = dict(old_sessions)
+    creates, updates = [], []
+    for session in sessions[:BINGE_WINDOW]:
+        old = previous.pop(session[0], None)
+        if old and old[5]:
+            session[5] = old[5]
+            if list(old[1:5]) != session[1:5]:
+                updates.append(session)
+        else:
+            creates.append(session)
+    # Sessions that no longer exist, or fell outside the window
+    deletes = [s[5] for s in previous.values() if s[5]]
+
+    async def nothing():
+        return []
+
+    saved = asyncio.Event()
+
+    created, updated, deleted = await asyncio.gather(
+        calendar_async.create_events_batch(
+            [_session_event(plan, episodes, s) for s in creates],
+            on_late_result=_late_creates(plan['id'], [tuple(s) for s in creates], saved),
+        ) if creates else nothing(),
+        calendar_async.update_events_batch([
+            {'event_id': s[5], **_session_event(plan, episodes, s)} for s in updates
+        ]) if updates else nothing(),
+        calendar_async.delete_events_batch(deletes) if deletes else nothing(),
+        return_exceptions=True,
     )
-    
+    # A batch that raised (e.g. timed out) is recorded as failed, but whatever the other
+    # batches did is still saved below before the error is passed on. Events a timed-out
+    # create batch still makes are attached afterwards by _late_creates.
+    failure = next((r for r in (created, updated, deleted) if isinstance(r, BaseException)), None)
+    rows = {s[0]: tuple(s) for s in sessions}
+
+    errors = []
+    if isinstance(created, BaseException):
+        # Sessions without an event are created on the next pass
+        created = [{'ok': False, 'id': None, 'error': str(created) or type(created).__name__}] * len(creates)
+    for session, result in zip(creates, created):
+        session[5] = result['id'] if result['ok'] else None
+        rows[session[0]] = tuple(session)
+        if not result['ok']:
+            errors.append((session[0], result['error']))
+    if isinstance(updated, BaseException):
+        # The events keep their old details, so saving those makes the next pass update them again
+        error = str(updated) or type(updated).__name__
+        updated = []
+        for session in updates:
+            rows[session[0]] = tuple(old_sessions[session[0]])
+            errors.append((session[0], error))
+    for session, result in zip(updates, updated):
+        if not result['ok']:
+            # Recreated on the next pass rather than left with stale details
+            session[5] = None
+            rows[session[0]] = tuple(session)
+            errors.append((session[0], result['error']))
+    if isinstance(deleted, BaseException):
+        # Keep the events to delete on the sessions table, so the next pass deletes them again
+        deleted = []
+        for old in old_sessions.values():
+            if old[5] in deletes:
+                rows[old[0]] = tuple(old)
+
+    plan['anchor_time'] = start_time.isoformat()
+    plan['anchor_day'] = next_day
+    plan['status'] = 'active' if sessions else 'done'
+    try:
+        with database.transaction():
+            database.save_binge_plan(plan)
+            database.replace_binge_sessions(plan['id'], next_day, [rows[day] for day in sorted(rows)])
+    finally:
+        saved.set()
+    if failure is not None:
+        raise failure
+
+    return {
+        'sessions': sessions,
+        'created': sum(1 for r in created if r['ok']),
+        'updated': sum(1 for r in updated if r['ok']),
+        'deleted': sum(1 for r in deleted if r['ok']),
+        'errors': errors,
+    }
+
+def _format_plan(plan: Dict[str, Any], episodes: list, report: Dict[str, Any]) -> str:
+    sessions = report['sessions']
+    total_minutes = sum(runtime for _, _, runtime in episodes)
+    remaining = len(episodes) - plan['watched']
+    pace = f"{plan['daily_minutes']} min/day" if plan['daily_minutes'] > 0 else f"{plan['episodes_per_day']} eps/day"
+
+    response = f"🎬 **Binge Plan for {plan['show_name']}**\n"
+    response += f"- Total Episodes: {len(episodes)} ({total_minutes // 60}h {total_minutes % 60}m)\n"
+    response += f"- Progress: {plan['watched']}/{len(episodes)} watched\n"
+    if not sessions:
+        response += "- All caught up! 🎉\n"
+        return response
+
+    scheduled = sessions[:BINGE_WINDOW]
+    start = datetime.datetime.fromisoformat(scheduled[0][3])
+    response += f"- Estimated Time: {len(sessions)} more days for {remaining} episodes (@ {pace})\n"
+    response += f"- Scheduled: Next {len(scheduled)} sessions starting {start.strftime('%Y-%m-%d %H:%M')}"
+    response += f" ({report['created']} added, {report['updated']} moved, {report['deleted']} removed).\n"
+    if report['errors']:
+        response += f"- ⚠️ {len(report['errors'])} sessions could not be saved to the calendar:\n"
+        for day, error in report['errors']:
+            response += f"  - Day {day}: {error}\n"
+    if len(sessions) > BINGE_WINDOW:
+        response += "*(Later sessions are added as you go; use continue_binge to roll the plan forward)*"
+    return response
+
+async def plan_and_schedule_binge(title: str, episodes_per_day: int, start_time_str: str, daily_minutes: int = 0) -> str:
+    """
+    Core logic for calculating and scheduling a binge plan.
+    Sessions hold `episodes_per_day` episodes each, or fill up to `daily_minutes`
+    of real episode runtime when that is given. Planning a show that already has an
+    active plan reschedules it and keeps the progress.
+    """
+    if episodes_per_day <= 0 and daily_minutes <= 0:
+        return "Give either a number of episodes per day or a daily time budget in minutes."
+
+    show, error = await _find_show(title)
+    if not show:
+        return error
+
+    episodes = await _load_episodes(show['id'])
+    if not episodes:
+        return f"Could not determine episode count for '{show['name']}'."
+
+    start_time = time_parser.parse_time(start_time_str)
     if not start_time:
         return f"Could not parse start time '{start_time_str}'."
-        
-    # 5. Schedule Events
-    max_sessions = 14
-    sessions_to_schedule = min(days_needed, max_sessions)
-    
-    current_time = start_time
-    ep_counter = 1
-    
-    for day in range(sessions_to_schedule):
-        end_ep = min(ep_counter + episodes_per_day - 1, total_episodes)
-        
-        summary = f"Binge {show_name} (Day {day+1}/{days_needed})"
-        description = f"Watching episodes {ep_counter}-{end_ep}.\nTotal progress: {end_ep}/{total_episodes} episodes."
-        
-        calendar_service.create_event(
-            summary=summary,
-            description=description,
-            start_time=current_time,
-            duration_minutes=daily_duration
-        )
-        
-        current_time += datetime.timedelta(days=1)
-        ep_counter += episodes_per_day
-        
-    response = f"🎬 **Binge Plan for {show_name}**\n"
-    response += f"- Total Episodes: {total_episodes}\n"
-    response += f"- Estimated Time: {days_needed} days (@ {episodes_per_day} eps/day)\n"
-    response += f"- Scheduled: First {sessions_to_schedule} sessions starting {start_time.strftime('%Y-%m-%d %H:%M')}.\n"
-    if days_needed > max_sessions:
-        response += f"*(Note: Only scheduled first {max_sessions} days to avoid calendar spam)*"
-        
-    return response
+
+    plan = database.find_active_binge_plan(show_id=show['id'])
+    if plan is None:
+        plan = database.create_binge_plan(show['id'], show['name'], episodes_per_day, daily_minutes, start_time.isoformat())
+    plan['episodes_per_day'] = episodes_per_day
+    plan['daily_minutes'] = daily_minutes
+
+    report = await _replan(plan, episodes, start_time)
+    return _format_plan(plan, episodes, report)
+
+async def reschedule_binge(title: str, start_time_str: str, episodes_per_day: int = 0, daily_minutes: int = 0) -> str:
+    """Move the rest of a binge plan to a new start time, optionally at a new pace."""
+    plan = await _find_plan(title)
+    if not plan:
+        return f"No active binge plan for '{title}'."
+
+    start_time = time_parser.parse_time(start_time_str)
+    if not start_time:
+        return f"Could not parse start time '{start_time_str}'."
+
+    if episodes_per_day > 0 or daily_minutes > 0:
+        plan['episodes_per_day'] = episodes_per_day
+        plan['daily_minutes'] = daily_minutes
+
+    episodes = await _load_episodes(plan['show_id'])
+    report = await _replan(plan, episodes, start_time)
+    return _format_plan(plan, episodes, report)
+
+async def mark_binge_watched(title: str, episode: str = "") -> str:
+    """
+    Record progress on a binge plan. `episode` is the last episode watched, as "S02E05"
+    or as a running count ("12"); empty means the next planned session was watched.
+    The remaining sessions are then replanned.
+    """
+    plan = await _find_plan(title)
+    if not plan:
+        return f"No active binge plan for '{title}'."
+
+    episodes = await _load_episodes(plan['show_id'])
+    match = re.fullmatch(r'\s*s(\d+)\s*e(\d+)\s*', episode, re.IGNORECASE)
+    if match:
+        key = (int(match.group(1)), int(match.group(2)))
+        positions = [i for i, (season, number, _) in enumerate(episodes) if (season, number) == key]
+        if not positions:
+            return f"{plan['show_name']} has no episode {_episode_label(*key)}."
+        watched = positions[0] + 1
+    elif episode.strip().isdigit():
+        watched = int(episode)
+    elif not episode.strip():
+        upcoming = [s for s in database.get_binge_sessions(plan['id']) if s[2] >= plan['watched']]
+        if not upcoming:
+            return f"No planned sessions left for {plan['show_name']}."
+        watched = upcoming[0][2] + 1
+    else:
+        return f"Could not understand episode '{episode}'. Use e.g. 'S02E05' or a number of episodes."
+
+    plan['watched'] = max(0, min(watched, len(episodes)))
+    report = await _replan(plan, episodes)
+    return _format_plan(plan, episodes, report)
+
+async def continue_binge(title: str) -> str:
+    """Roll a binge plan forward: schedule its next sessions and pick up newly released episodes."""
+    plan = await _find_plan(title)
+    if not plan:
+        return f"No active binge plan for '{title}'."
+
+    episodes = await _load_episodes(plan['show_id'])
+    report = await _replan(plan, episodes)
+    return _format_plan(plan, episodes, report)
 
 async def cancel_binge_plan(title: str) -> str:
     """
     Cancel (delete) all binge-watching sessions for a TV show.
     """
-    # 1. Find the show to get exact name
-    results = await movie_service.search_movies(title)
-    tv_results = [r for r in results if r.get('media_type') == 'tv']
-    
-    if not tv_results:
-        # Try searching for events directly with the query if show not found
-        show_name = title
+    # 1. A saved plan knows its own events
+    plan = await _find_plan(title)
+    if plan:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        event_ids = [
+            s[5] for s in database.get_binge_sessions(plan['id'])
+            if s[5] and datetime.datetime.fromisoformat(s[3]) >= now
+        ]
+        results = await calendar_async.delete_events_batch(event_ids) if event_ids else []
+        plan['status'] = 'cancelled'
+        database.save_binge_plan(plan)
+        show_name = plan['show_name']
     else:
-        show_name = tv_results[0]['name']
-        
-    # 2. Find events
-    # Binge events are named "Binge {ShowName} (Day X/Y)"
-    query = f"Binge {show_name}"
-    events = calendar_service.list_events(query=query, max_results=50)
-    
-    if not events:
-        return f"Could not find any binge sessions for '{show_name}'."
-        
-    # 3. Delete all
-    count = 0
-    for event in events:
-        if show_name.lower() in event.get('summary', '').lower():
-            calendar_service.delete_event(event['id'])
-            count += 1
-            
-    return f"Cancelled (deleted) {count} binge sessions for '{show_name}'."
+        # 2. Older plans were never saved: find their events by name
+        show, _ = await _find_show(title)
+        show_name = show['name'] if show else title
+
+        # Binge events are named "Binge {ShowName} (Day X/Y)"
+        query = f"Binge {show_name}"
+        events = await event_index.find_events(query, kind='binge', max_results=50)
+
+        if not events:
+            return f"Could not find any binge sessions for '{show_name}'."
+
+        # Delete all in one batch request
+        matching = [e for e in events if show_name.lower() in e.get('summary', '').lower()]
+        results = await calendar_async.delete_events_batch([e['id'] for e in matching]) if matching else []
+
+    count = sum(1 for r in results if r['ok'])
+
+    response = f"Cancelled (deleted) {count} binge sessions for '{show_name}'."
+    errors = [r['error'] for r in results if not r['ok']]
+    if errors:
+        response += f"\n⚠️ {len(errors)} could not be deleted: {errors[0]}"
+    return response
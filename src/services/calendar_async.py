@@ -0,0 +1,147 @@
+import os
+import asyncio
+import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from services import calendar_service
+from services.calendar_service import DEFAULT_PAGE_SIZE, EVENT_FIELDS, MINIMAL_EVENT_FIELDS
+
+# googleapiclient is blocking, so calls run in a small dedicated thread pool
+# instead of on the event loop (overridable via env)
+CALENDAR_MAX_WORKERS = int(os.getenv("CALENDAR_MAX_WORKERS", "4"))
+CALENDAR_TIMEOUT = float(os.getenv("CALENDAR_TIMEOUT", "30"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=CALENDAR_MAX_WORKERS, thread_name_prefix="calendar")
+    return _executor
+
+
+def shutdown():
+    """Stop the worker pool. Called on server shutdown."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run(
+    func: Callable,
+    *args,
+    timeout: Optional[float] = None,
+    on_late_result: Optional[Callable[[Any], None]] = None,
+    **kwargs,
+) -> Any:
+    """
+    Run a blocking calendar_service call in the worker pool.
+    Raises TimeoutError after `timeout` seconds (default CALENDAR_TIMEOUT); the worker
+    thread still finishes the call in the background. If the caller times out or is
+    cancelled, `on_late_result` gets the call's result once it does finish (on the event
+    loop), so the caller can still record what the call changed.
+    """
+    loop = asyncio.get_running_loop()
+    future = _get_executor().submit(func, *args, **kwargs)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout or CALENDAR_TIMEOUT)
+    except (TimeoutError, asyncio.CancelledError):
+        if on_late_result is not None:
+            future.add_done_callback(lambda done: _deliver_late(loop, done, on_late_result))
+        raise
+
+
+def _deliver_late(loop: asyncio.AbstractEventLoop, future: Future, callback: Callable[[Any], None]):
+    """Hand a late result to its callback on the event loop (runs in the worker thread)."""
+    if future.cancelled() or future.exception() is not None:
+        return
+
+    def deliver():
+        try:
+            callback(future.result())
+        except Exception as e:
+            print(f"Warning: could not record a late calendar result: {e}")
+
+    try:
+        loop.call_soon_threadsafe(deliver)
+    except RuntimeError:
+        # The event loop is gone (server shutdown); nothing is left to record it in
+        pass
+
+
+async def create_event(
+    summary: str,
+    description: str,
+    start_time: datetime.datetime,
+    duration_minutes: int = 120,
+    tags: Optional[Dict[str, Any]] = None,
+):
+    """Create a calendar event. Pass `tags` to mark it as a CineMate event."""
+    return await run(calendar_service.create_event, summary, description, start_time, duration_minutes, tags)
+
+
+async def list_events(query: str, max_results: int = 5):
+    """List upcoming events matching a query."""
+    return await run(calendar_service.list_events, query, max_results)
+
+
+async def list_events_in_range(start_time: datetime.datetime, end_time: datetime.datetime):
+    """List events within a specific time range."""
+    return await run(calendar_service.list_events_in_range, start_time, end_time)
+
+
+async def update_event(event_id: str, summary: str, description: str, start_time: datetime.datetime, duration_minutes: int = 120):
+    """Update an existing calendar event."""
+    return await run(calendar_service.update_event, event_id, summary, description, start_time, duration_minutes)
+
+
+async def delete_event(event_id: str):
+    """Delete a calendar event."""
+    return await run(calendar_service.delete_event, event_id)
+
+
+async def create_events_batch(
+    events: List[Dict[str, Any]],
+    on_late_result: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """Create several events in batched requests. `on_late_result` is as for run()."""
+    return await run(calendar_service.create_events_batch, events, on_late_result=on_late_result)
+
+
+async def update_events_batch(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Update several events in batched requests."""
+    return await run(calendar_service.update_events_batch, events)
+
+
+async def delete_events_batch(event_ids: List[str]) -> List[Dict[str, Any]]:
+    """Delete several events in batched requests."""
+    return await run(calendar_service.delete_events_batch, event_ids)
+
+
+async def stream_events(
+    start_time: datetime.datetime,
+    end_time: Optional[datetime.datetime] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    fields: str = EVENT_FIELDS,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yield pages of events as they arrive. The next page is requested while the caller
+    is still working on the current one.
+    """
+    def fetch(page_token):
+        return asyncio.ensure_future(run(
+            calendar_service.list_events_page, start_time, end_time, page_token, page_size, fields
+        ))
+    
+    next_page = fetch(None)
+    try:
+        while next_page:
+            events, page_token = await next_page
+            next_page = fetch(page_token) if page_token else None
+            yield events
+    finally:
+        # The caller stopped early: drop the prefetched page
+        if next_page:
+            next_page.cancel()
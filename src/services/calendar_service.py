@@ -1,51 +1,116 @@
 import os.path
+import json
 import datetime
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+from core import database
+
+# The Google client libraries take a noticeable share of startup time, so they are
+# imported by the functions that use them, on the first calendar call
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
-def get_calendar_service():
-    creds = None
-    
-    # Get absolute path to the project root (2 levels up)
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
-    token_path = os.path.join(base_dir, 'token.json')
-    creds_path = os.path.join(base_dir, 'credentials.json')
-    
-    # The file token.json stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first
-    # time.
-    if os.path.exists(token_path):
-        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+# Refresh the access token when it has less than this many seconds left
+TOKEN_REFRESH_MARGIN = 300
+
+# Calendar accepts up to 50 calls in one batch HTTP request
+BATCH_SIZE = 50
+
+# Event listing: page size (API max 2500) and the partial-response field mask.
+# EVENT_FIELDS covers everything the tools read; bulk cancellation needs even less.
+DEFAULT_PAGE_SIZE = 250
+EVENT_FIELDS = 'items(id,summary,description,start,end)'
+MINIMAL_EVENT_FIELDS = 'items(id,summary,start)'
+
+# Events CineMate creates carry this private extended property (plus kind/title/... tags),
+# which is how the local event index recognises them
+CINEMATE_TAG = 'cinemate'
+SYNC_FIELDS = 'nextPageToken,nextSyncToken,items(id,status,summary,description,start,end,htmlLink,extendedProperties)'
+
+# Get absolute path to the project root (2 levels up)
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+TOKEN_PATH = os.path.join(BASE_DIR, 'token.json')
+CREDENTIALS_PATH = os.path.join(BASE_DIR, 'credentials.json')
+
+# Process-wide credentials and parsed discovery document, guarded by _lock
+_creds: Optional['Credentials'] = None
+_discovery_doc: Optional[Dict[str, Any]] = None
+_lock = threading.Lock()
+# httplib2 connections are not thread-safe, so each thread gets its own service object
+_local = threading.local()
+
+def load_discovery_document() -> Dict[str, Any]:
+    """Parse the Calendar v3 discovery document bundled with googleapiclient (once)."""
+    global _discovery_doc
+    with _lock:
+        if _discovery_doc is None:
+            from googleapiclient.discovery_cache import get_static_doc
+            _discovery_doc = json.loads(get_static_doc('calendar', 'v3'))
+        return _discovery_doc
+
+def _needs_refresh(creds: 'Credentials') -> bool:
+    if not creds.valid:
+        return True
+    # google-auth keeps expiry as naive UTC
+    margin = datetime.timedelta(seconds=TOKEN_REFRESH_MARGIN)
+    return creds.expiry is not None and creds.expiry - datetime.datetime.utcnow() < margin
+
+def get_credentials() -> 'Credentials':
+    """Return cached OAuth credentials, refreshing them shortly before they expire."""
+    global _creds
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    with _lock:
+        # The file token.json stores the user's access and refresh tokens, and is
+        # created automatically when the authorization flow completes for the first
+        # time.
+        if _creds is None and os.path.exists(TOKEN_PATH):
+            _creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
+        
+        if _creds and not _needs_refresh(_creds):
+            return _creds
+        
+        # If there are no (valid) credentials available, let the user log in.
+        if _creds and _creds.refresh_token:
+            _creds.refresh(Request())
         else:
-            if not os.path.exists(creds_path):
-                raise FileNotFoundError(f"credentials.json not found at {creds_path}. Please place it in the project root.")
+            if not os.path.exists(CREDENTIALS_PATH):
+                raise FileNotFoundError(f"credentials.json not found at {CREDENTIALS_PATH}. Please place it in the project root.")
                 
             flow = InstalledAppFlow.from_client_secrets_file(
-                creds_path, SCOPES)
-            creds = flow.run_local_server(port=0)
+                CREDENTIALS_PATH, SCOPES)
+            _creds = flow.run_local_server(port=0)
         # Save the credentials for the next run
-        with open(token_path, 'w') as token:
-            token.write(creds.to_json())
+        with open(TOKEN_PATH, 'w') as token:
+            token.write(_creds.to_json())
+        return _creds
 
-    service = build('calendar', 'v3', credentials=creds)
+def get_calendar_service():
+    """Return this thread's Calendar service, built from the cached discovery document."""
+    creds = get_credentials()
+    service = getattr(_local, 'service', None)
+    # Credentials are refreshed in place, so a new object only appears after a new login
+    if service is None or _local.creds is not creds:
+        from googleapiclient.discovery import build_from_document
+        service = build_from_document(load_discovery_document(), credentials=creds)
+        _local.service = service
+        _local.creds = creds
     return service
 
-def create_event(summary: str, description: str, start_time: datetime.datetime, duration_minutes: int = 120):
-    """Create a calendar event."""
-    service = get_calendar_service()
-    
+def _event_body(
+    summary: str,
+    description: str,
+    start_time: datetime.datetime,
+    duration_minutes: int = 120,
+    tags: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
     end_time = start_time + datetime.timedelta(minutes=duration_minutes)
     
-    event = {
+    body = {
         'summary': summary,
         'description': description,
         'start': {
@@ -57,10 +122,109 @@ def create_event(summary: str, description: str, start_time: datetime.datetime,
             'timeZone': 'UTC',
         },
     }
+    if tags is not None:
+        private = {key: str(value) for key, value in tags.items()}
+        private[CINEMATE_TAG] = '1'
+        body['extendedProperties'] = {'private': private}
+    return body
+
+def _utc_iso(when: Optional[Dict[str, str]]) -> Optional[str]:
+    """An event's start/end as a sortable UTC string."""
+    if not when:
+        return None
+    if 'dateTime' not in when:
+        return f"{when['date']}T00:00:00Z"
+    moment = datetime.datetime.fromisoformat(when['dateTime'])
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
 
+def index_row(event: Dict[str, Any]) -> Optional[Tuple]:
+    """The calendar_events row for a live CineMate-tagged event, or None for anything else."""
+    tags = event.get('extendedProperties', {}).get('private', {})
+    if tags.get(CINEMATE_TAG) != '1' or event.get('status') == 'cancelled':
+        return None
+    return (
+        event['id'], tags.get('kind'), tags.get('title'), tags.get('series'),
+        event.get('summary'), event.get('description'),
+        _utc_iso(event.get('start')), _utc_iso(event.get('end')),
+        event.get('htmlLink'), json.dumps(tags),
+    )
+
+def _remember(events: List[Dict[str, Any]]):
+    """Write created or updated events through to the local index."""
+    rows = [row for row in map(index_row, events) if row]
+    if rows:
+        database.upsert_calendar_events(rows)
+
+def _execute_batch(requests: list) -> List[Dict[str, Any]]:
+    """
+    Send API requests in batch HTTP calls of up to BATCH_SIZE each.
+    Returns one {'ok', 'response', 'error'} dict per request, in order. If a batch call
+    itself fails, its requests that got no response are marked failed and later
+    batches are still sent, so results already received are never lost.
+    """
+    service = get_calendar_service()
+    results: List[Dict[str, Any]] = [{}] * len(requests)
+    
+    def callback(request_id, response, exception):
+        results[int(request_id)] = {
+            'ok': exception is None,
+            'response': response,
+            'error': str(exception) if exception else None,
+        }
+    
+    for offset in range(0, len(requests), BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=callback)
+        for index in range(offset, min(offset + BATCH_SIZE, len(requests))):
+            batch.add(requests[index], request_id=str(index))
+        try:
+            batch.execute()
+        except Exception as e:
+            for index in range(offset, min(offset + BATCH_SIZE, len(requests))):
+                if not results[index]:
+                    results[index] = {'ok': False, 'response': None, 'error': str(e)}
+    return results
+
+def create_event(
+    summary: str,
+    description: str,
+    start_time: datetime.datetime,
+    duration_minutes: int = 120,
+    tags: Optional[Dict[str, Any]] = None,
+):
+    """Create a calendar event. Pass `tags` to mark it as a CineMate event."""
+    service = get_calendar_service()
+    event = _event_body(summary, description, start_time, duration_minutes, tags)
     event = service.events().insert(calendarId='primary', body=event).execute()
+    _remember([event])
     return event.get('htmlLink')
 
+def create_events_batch(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Create several events in batched requests. Each item holds create_event's arguments
+    (summary, description, start_time, optional duration_minutes and tags).
+    Returns per event {'ok', 'id', 'link', 'error'}.
+    """
+    service = get_calendar_service()
+    requests = [
+        service.events().insert(calendarId='primary', body=_event_body(**event))
+        for event in events
+    ]
+    return _written(_execute_batch(requests))
+
+def _written(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    _remember([r['response'] for r in results if r['ok']])
+    return [
+        {
+            'ok': r['ok'],
+            'id': (r['response'] or {}).get('id'),
+            'link': (r['response'] or {}).get('htmlLink'),
+            'error': r['error'],
+        }
+        for r in results
+    ]
+
 def list_events(query: str, max_results: int = 5):
     """List upcoming events matching a query."""
     service = get_calendar_service()
@@ -76,47 +240,116 @@ def list_events(query: str, max_results: int = 5):
     ).execute()
     return events_result.get('items', [])
 
-def list_events_in_range(start_time: datetime.datetime, end_time: datetime.datetime):
-    """List events within a specific time range."""
+def list_events_page(
+    start_time: datetime.datetime,
+    end_time: Optional[datetime.datetime] = None,
+    page_token: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    fields: str = EVENT_FIELDS,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch one page of events from start_time (to end_time). Returns (events, next page token)."""
     service = get_calendar_service()
     
-    events_result = service.events().list(
-        calendarId='primary', 
-        timeMin=start_time.isoformat(),
-        timeMax=end_time.isoformat(),
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    return events_result.get('items', [])
+    params = {
+        'calendarId': 'primary',
+        'timeMin': start_time.isoformat(),
+        'singleEvents': True,
+        'orderBy': 'startTime',
+        'maxResults': page_size,
+        'fields': f'nextPageToken,{fields}',
+    }
+    if end_time:
+        params['timeMax'] = end_time.isoformat()
+    if page_token:
+        params['pageToken'] = page_token
+    
+    events_result = service.events().list(**params).execute()
+    return events_result.get('items', []), events_result.get('nextPageToken')
 
-def update_event(event_id: str, summary: str, description: str, start_time: datetime.datetime, duration_minutes: int = 120):
-    """Update an existing calendar event."""
+def list_changes(
+    sync_token: Optional[str] = None,
+    page_token: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+    """
+    One page of an events sync: everything changed since `sync_token` (including
+    cancelled events), or every event when there is no token yet.
+    Returns (events, next page token, next sync token). A stale token raises HttpError 410.
+    """
     service = get_calendar_service()
     
-    end_time = start_time + datetime.timedelta(minutes=duration_minutes)
-    
-    event = {
-        'summary': summary,
-        'description': description,
-        'start': {
-            'dateTime': start_time.isoformat(),
-            'timeZone': 'UTC', # Or system local if preferred, but isoformat usually carries offset if aware
-        },
-        'end': {
-            'dateTime': end_time.isoformat(),
-            'timeZone': 'UTC',
-        },
+    # Incremental sync rejects q/timeMin/privateExtendedProperty filters, so the full
+    # sync is unfiltered too and CineMate events are picked out by their tags
+    params = {
+        'calendarId': 'primary',
+        'maxResults': page_size,
+        'fields': SYNC_FIELDS,
     }
+    if sync_token:
+        params['syncToken'] = sync_token
+        params['showDeleted'] = True
+    if page_token:
+        params['pageToken'] = page_token
     
-    updated_event = service.events().update(calendarId='primary', eventId=event_id, body=event).execute()
+    result = service.events().list(**params).execute()
+    return result.get('items', []), result.get('nextPageToken'), result.get('nextSyncToken')
+
+def iter_event_pages(
+    start_time: datetime.datetime,
+    end_time: Optional[datetime.datetime] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    fields: str = EVENT_FIELDS,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield events page by page, following nextPageToken."""
+    page_token = None
+    while True:
+        events, page_token = list_events_page(start_time, end_time, page_token, page_size, fields)
+        yield events
+        if not page_token:
+            return
+
+def list_events_in_range(start_time: datetime.datetime, end_time: datetime.datetime):
+    """List events within a specific time range."""
+    return [event for page in iter_event_pages(start_time, end_time) for event in page]
+
+def update_event(event_id: str, summary: str, description: str, start_time: datetime.datetime, duration_minutes: int = 120):
+    """Update an existing calendar event."""
+    service = get_calendar_service()
+    event = _event_body(summary, description, start_time, duration_minutes)
+    # patch rather than update, so the event keeps its CineMate tags
+    updated_event = service.events().patch(calendarId='primary', eventId=event_id, body=event).execute()
+    _remember([updated_event])
     return updated_event.get('htmlLink')
 
+def update_events_batch(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Update several events in batched requests. Each item holds update_event's arguments
+    (event_id, summary, description, start_time, optional duration_minutes and tags).
+    Returns per event {'ok', 'id', 'link', 'error'}.
+    """
+    service = get_calendar_service()
+    requests = []
+    for event in events:
+        fields = dict(event)
+        event_id = fields.pop('event_id')
+        requests.append(service.events().patch(calendarId='primary', eventId=event_id, body=_event_body(**fields)))
+    return _written(_execute_batch(requests))
+
 def delete_event(event_id: str):
     """Delete a calendar event."""
     service = get_calendar_service()
     service.events().delete(calendarId='primary', eventId=event_id).execute()
+    database.delete_calendar_events([event_id])
     return True
 
+def delete_events_batch(event_ids: List[str]) -> List[Dict[str, Any]]:
+    """Delete several events in batched requests. Returns per event {'ok', 'error'}."""
+    service = get_calendar_service()
+    requests = [service.events().delete(calendarId='primary', eventId=event_id) for event_id in event_ids]
+    results = _execute_batch(requests)
+    database.delete_calendar_events([event_id for event_id, r in zip(event_ids, results) if r['ok']])
+    return [{'ok': r['ok'], 'error': r['error']} for r in results]
+
 if __name__ == '__main__':
     # Test auth
     try:
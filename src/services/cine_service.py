@@ -1,10 +1,47 @@
 from services import movie_service
 from core import database
-from services import calendar_service
-import dateparser
-from tzlocal import get_localzone_name
+from services import calendar_async
+from services import event_index
+from services import time_parser
+import asyncio
 import datetime
 
+# Max titles resolved at once by the batch tools
+BATCH_CONCURRENCY = 8
+
+# History/watchlist listings come in pages of DEFAULT_PAGE_SIZE rows (at most MAX_PAGE_SIZE)
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Everyday genre names -> the substring TMDB uses for them
+GENRE_ALIASES = {
+    "sci-fi": "science fiction",
+    "scifi": "science fiction",
+    "sf": "science fiction",
+    "romcom": "romance",
+    "rom-com": "romance",
+    "doc": "documentary",
+    "docs": "documentary",
+    "cartoon": "animation",
+    "anime": "animation",
+}
+
+def _split_titles(titles: str) -> list:
+    return [t.strip() for t in titles.split(',') if t.strip()]
+
+async def _gather_bounded(func, items: list) -> list:
+    """
+    Run `func` over `items` concurrently, at most BATCH_CONCURRENCY at a time.
+    Results keep the input order; a failing item yields its exception instead of a result.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+    
+    return await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+
 # --- Search & Details ---
 async def search_and_format(query: str) -> str:
     try:
@@ -24,14 +61,15 @@ async def search_and_format(query: str) -> str:
         return f"Error searching: {e}"
 
 async def get_details_logic(title: str) -> str:
-    results = await movie_service.search_movies(title)
+    results = await movie_service.resolve_title(title)
     if not results:
         return f"Could not find '{title}'."
     
     item = results[0]
     media_type = item.get('media_type', 'movie')
     
-    details = await movie_service.get_movie_details(item['id'], media_type)
+    # Providers, credits and external ids come along, cached for follow-up questions
+    details = await movie_service.get_title_bundle(item['id'], media_type)
     if not details:
         return "Details not found."
     
@@ -48,37 +86,48 @@ Rating: {details.get('vote_average', 'N/A')}
     else:
         output += f"Seasons: {details.get('number_of_seasons', 'N/A')}, Episodes: {details.get('number_of_episodes', 'N/A')}\n"
         
+    cast = [c['name'] for c in details.get('credits', {}).get('cast', [])[:5]]
+    if cast:
+        output += f"Cast: {', '.join(cast)}\n"
+    imdb_id = details.get('external_ids', {}).get('imdb_id')
+    if imdb_id:
+        output += f"IMDb: https://www.imdb.com/title/{imdb_id}/\n"
+        
     output += f"Overview: {details.get('overview', 'N/A')}\n"
     return output
 
 # --- Logging & Watchlist (Batch) ---
 async def batch_log_movies(titles: str, rating: float, review: str) -> str:
+    title_list = _split_titles(titles)
+    resolved = await _gather_bounded(movie_service.resolve_title, title_list)
+    
     results_log = []
-    title_list = [t.strip() for t in titles.split(',') if t.strip()]
+    to_log = []
+    for title, results in zip(title_list, resolved):
+        if isinstance(results, Exception):
+            results_log.append(f"❌ '{title}': Error {results}")
+            continue
+        if not results:
+            results_log.append(f"❌ '{title}': Not found.")
+            continue
+            
+        movie = results[0]
+        media_type = movie.get('media_type', 'movie')
+        title_found = movie.get('title') if media_type == 'movie' else movie.get('name')
+        
+        to_log.append((movie['id'], rating, review, media_type))
+        results_log.append(f"✅ '{title_found}' logged.")
     
-    for title in title_list:
+    if to_log:
         try:
-            results = await movie_service.search_movies(title)
-            if not results:
-                results_log.append(f"❌ '{title}': Not found.")
-                continue
-                
-            movie = results[0]
-            movie_id = movie['id']
-            media_type = movie.get('media_type', 'movie')
-            title_found = movie.get('title') if media_type == 'movie' else movie.get('name')
-            
-            database.add_to_history(movie_id, rating, review, media_type)
-            database.remove_from_watchlist(movie_id, media_type)
-            
-            results_log.append(f"✅ '{title_found}' logged.")
+            database.log_history_batch(to_log)
         except Exception as e:
-            results_log.append(f"❌ '{title}': Error {e}")
+            return f"❌ Could not save to history: {e}"
             
     return "\n".join(results_log)
 
 async def delete_from_history_logic(title: str) -> str:
-    results = await movie_service.search_movies(title)
+    results = await movie_service.resolve_title(title)
     if not results:
         return f"Could not find '{title}'."
     
@@ -90,32 +139,43 @@ async def delete_from_history_logic(title: str) -> str:
     return f"Removed '{title_str}' from history."
 
 async def batch_add_watchlist(titles: str) -> str:
+    title_list = _split_titles(titles)
+    resolved = await _gather_bounded(movie_service.resolve_title, title_list)
+    
     results_log = []
-    title_list = [t.strip() for t in titles.split(',') if t.strip()]
+    pending = []  # (position in results_log, title found) awaiting the DB write
+    to_add = []
+    for title, results in zip(title_list, resolved):
+        if isinstance(results, Exception):
+            results_log.append(f"❌ '{title}': Error {results}")
+            continue
+        if not results:
+            results_log.append(f"❌ '{title}': Not found.")
+            continue
+            
+        movie = results[0]
+        media_type = movie.get('media_type', 'movie')
+        title_found = movie.get('title') if media_type == 'movie' else movie.get('name')
+        
+        pending.append((len(results_log), title_found))
+        results_log.append(None)
+        to_add.append((movie['id'], media_type))
     
-    for title in title_list:
+    if to_add:
         try:
-            results = await movie_service.search_movies(title)
-            if not results:
-                results_log.append(f"❌ '{title}': Not found.")
-                continue
-                
-            movie = results[0]
-            movie_id = movie['id']
-            media_type = movie.get('media_type', 'movie')
-            title_found = movie.get('title') if media_type == 'movie' else movie.get('name')
-            
-            if database.add_to_watchlist(movie_id, media_type):
-                results_log.append(f"✅ '{title_found}' added.")
-            else:
-                results_log.append(f"⚠️ '{title_found}' already in watchlist.")
+            added = database.add_to_watchlist_batch(to_add)
         except Exception as e:
-            results_log.append(f"❌ '{title}': Error {e}")
+            return f"❌ Could not save to watchlist: {e}"
+        for (index, title_found), was_added in zip(pending, added):
+            if was_added:
+                results_log[index] = f"✅ '{title_found}' added."
+            else:
+                results_log[index] = f"⚠️ '{title_found}' already in watchlist."
             
     return "\n".join(results_log)
 
 async def delete_from_watchlist_logic(title: str) -> str:
-    results = await movie_service.search_movies(title)
+    results = await movie_service.resolve_title(title)
     if not results:
         return f"Could not find '{title}'."
     
@@ -128,52 +188,29 @@ async def delete_from_watchlist_logic(title: str) -> str:
 
 # --- Scheduling ---
 async def schedule_movie_logic(title: str, time_str: str) -> str:
-    results = await movie_service.search_movies(title)
+    results = await movie_service.resolve_title(title)
     if not results:
         return f"Could not find '{title}'."
     item = results[0]
     media_type = item.get('media_type', 'movie')
     title_str = item.get('title') if media_type == 'movie' else item.get('name')
     
-    # Explicitly handle timezone. If dateparser doesn't pick it up, force it.
-    # The user is in India (IST).
-    # We MUST set RELATIVE_BASE to current IST time so "today" means "today in India".
-    import pytz
-    ist = pytz.timezone('Asia/Kolkata')
-    now_ist = datetime.datetime.now(ist).replace(tzinfo=None) # dateparser expects naive for base
-
-    settings = {
-        'PREFER_DATES_FROM': 'future',
-        'RETURN_AS_TIMEZONE_AWARE': True,
-        'TIMEZONE': 'Asia/Kolkata', # Force IST as user requested
-        'TO_TIMEZONE': 'Asia/Kolkata',
-        'RELATIVE_BASE': now_ist
-    }
-    
-    start_time = dateparser.parse(time_str, settings=settings)
+    # Read in CINEMATE_TIMEZONE (default: the system's), so "today" means the user's today
+    start_time = time_parser.parse_time(time_str)
     
     if not start_time:
         return f"Could not parse time '{time_str}'."
-        
-    # Ensure it's in the future if 'today' was used but time passed?
-    # dateparser handles 'future' preference but let's be safe.
-    now = datetime.datetime.now(start_time.tzinfo)
-    if start_time < now:
-        # If user said "10pm" and it's 11pm, dateparser might give today 10pm (past).
-        # If PREFER_DATES_FROM is future, it should give tomorrow.
-        # But if it gave past, let's warn or adjust? 
-        # For now, just proceed, calendar will accept past events.
-        pass
-
-    link = calendar_service.create_event(
+
+    link = await calendar_async.create_event(
         summary=f"Watch {title_str}",
         description=f"Watching {title_str} ({media_type}).\nOverview: {item.get('overview', '')}",
-        start_time=start_time
+        start_time=start_time,
+        tags={'kind': 'movie', 'title': title_str, 'tmdb_id': item['id'], 'media_type': media_type},
     )
     return f"Scheduled '{title_str}' for {start_time.strftime('%Y-%m-%d %H:%M %Z')}. Event link: {link}"
 
 async def reschedule_movie_logic(title: str, new_time_str: str) -> str:
-    events = calendar_service.list_events(query=title)
+    events = await event_index.find_events(title)
     if not events:
         return f"Could not find any upcoming calendar events for '{title}'."
     
@@ -182,20 +219,12 @@ async def reschedule_movie_logic(title: str, new_time_str: str) -> str:
     old_summary = event.get('summary', '')
     old_desc = event.get('description', '')
     
-    local_tz = get_localzone_name()
-    start_time = dateparser.parse(
-        new_time_str, 
-        settings={
-            'PREFER_DATES_FROM': 'future',
-            'TIMEZONE': local_tz,
-            'RETURN_AS_TIMEZONE_AWARE': True
-        }
-    )
+    start_time = time_parser.parse_time(new_time_str)
     
     if not start_time:
         return f"Could not parse time '{new_time_str}'."
         
-    link = calendar_service.update_event(
+    link = await calendar_async.update_event(
         event_id=event_id,
         summary=old_summary,
         description=old_desc,
@@ -205,34 +234,75 @@ async def reschedule_movie_logic(title: str, new_time_str: str) -> str:
     return f"Rescheduled '{old_summary}' to {start_time.strftime('%Y-%m-%d %H:%M %Z')}. Link: {link}"
 
 # --- Cancellation ---
+async def _delete_events(events: list) -> tuple:
+    """
+    Delete events in batched calendar requests.
+    Returns (number deleted, one line per event noting any failure).
+    """
+    results = await calendar_async.delete_events_batch([event['id'] for event in events])
+    
+    count = 0
+    lines = []
+    for event, result in zip(events, results):
+        summary = event.get('summary', 'Unknown')
+        if result['ok']:
+            count += 1
+            lines.append(summary)
+        else:
+            lines.append(f"{summary} (failed: {result['error']})")
+    return count, lines
+
+async def _cancel_events_in_range(start_time: datetime.datetime, end_time: datetime.datetime) -> tuple:
+    """
+    List every event in the range, then delete them in batches. Returns (number deleted,
+    status lines). Nothing is deleted until the listing is done: page tokens assume the
+    result set does not change while it is being paged through.
+    """
+    events = {}
+    async for page in calendar_async.stream_events(
+        start_time, end_time, fields=calendar_async.MINIMAL_EVENT_FIELDS
+    ):
+        for event in page:
+            events.setdefault(event['id'], event)
+    if not events:
+        return 0, []
+    return await _delete_events(list(events.values()))
+
 async def batch_cancel_movies(titles: str) -> str:
-    results_log = []
-    title_list = [t.strip() for t in titles.split(',') if t.strip()]
+    title_list = _split_titles(titles)
     
-    for title in title_list:
-        try:
-            events = calendar_service.list_events(query=title)
-            if not events:
-                results_log.append(f"❌ '{title}': No event found.")
-                continue
-            
-            event = events[0]
-            event_id = event['id']
-            summary = event.get('summary', 'Unknown Event')
-            
-            calendar_service.delete_event(event_id)
-            results_log.append(f"✅ '{summary}' cancelled.")
-        except Exception as e:
-            results_log.append(f"❌ '{title}': Error {e}")
+    async def find(title):
+        events = await event_index.find_events(title)
+        return events[0] if events else None
+    
+    found = await _gather_bounded(find, title_list)
+    
+    # Delete every matched event in one batch; two titles may match the same event
+    to_delete = {}
+    for event in found:
+        if event and not isinstance(event, Exception):
+            to_delete[event['id']] = event
+    try:
+        results = await calendar_async.delete_events_batch(list(to_delete)) if to_delete else []
+    except Exception as e:
+        return f"❌ Could not cancel events: {e}"
+    outcome = dict(zip(to_delete, results))
+    
+    results_log = []
+    for title, event in zip(title_list, found):
+        if isinstance(event, Exception):
+            results_log.append(f"❌ '{title}': Error {event}")
+        elif event is None:
+            results_log.append(f"❌ '{title}': No event found.")
+        elif not outcome[event['id']]['ok']:
+            results_log.append(f"❌ '{title}': Error {outcome[event['id']]['error']}")
+        else:
+            results_log.append(f"✅ '{event.get('summary', 'Unknown Event')}' cancelled.")
             
     return "\n".join(results_log)
 
 async def cancel_events_on_date(date_str: str) -> str:
-    local_tz = get_localzone_name()
-    target_date = dateparser.parse(
-        date_str, 
-        settings={'TIMEZONE': local_tz, 'RETURN_AS_TIMEZONE_AWARE': True}
-    )
+    target_date = time_parser.parse_time(date_str, prefer_future=False)
     
     if not target_date:
         return f"Could not parse date '{date_str}'."
@@ -240,24 +310,16 @@ async def cancel_events_on_date(date_str: str) -> str:
     start_of_day = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_day = start_of_day + datetime.timedelta(days=1) - datetime.timedelta(microseconds=1)
     
-    events = calendar_service.list_events_in_range(start_of_day, end_of_day)
+    count, deleted_titles = await _cancel_events_in_range(start_of_day, end_of_day)
     
-    if not events:
+    if not deleted_titles:
         return f"No events found on {start_of_day.strftime('%Y-%m-%d')}."
         
-    count = 0
-    deleted_titles = []
-    for event in events:
-        calendar_service.delete_event(event['id'])
-        deleted_titles.append(event.get('summary', 'Unknown'))
-        count += 1
-        
     return f"Cancelled {count} events on {start_of_day.strftime('%Y-%m-%d')}:\n- " + "\n- ".join(deleted_titles)
 
 async def cancel_events_in_range(start_str: str, end_str: str) -> str:
-    local_tz = get_localzone_name()
-    start_date = dateparser.parse(start_str, settings={'TIMEZONE': local_tz, 'RETURN_AS_TIMEZONE_AWARE': True})
-    end_date = dateparser.parse(end_str, settings={'TIMEZONE': local_tz, 'RETURN_AS_TIMEZONE_AWARE': True})
+    start_date = time_parser.parse_time(start_str, prefer_future=False)
+    end_date = time_parser.parse_time(end_str, prefer_future=False)
     
     if not start_date or not end_date:
         return f"Could not parse dates: '{start_str}' to '{end_str}'."
@@ -265,23 +327,15 @@ async def cancel_events_in_range(start_str: str, end_str: str) -> str:
     start_time = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
     end_time = end_date.replace(hour=23, minute=59, second=59, microsecond=999999)
     
-    events = calendar_service.list_events_in_range(start_time, end_time)
+    count, deleted_titles = await _cancel_events_in_range(start_time, end_time)
     
-    if not events:
+    if not deleted_titles:
         return f"No events found between {start_time.strftime('%Y-%m-%d')} and {end_time.strftime('%Y-%m-%d')}."
         
-    count = 0
-    deleted_titles = []
-    for event in events:
-        calendar_service.delete_event(event['id'])
-        deleted_titles.append(event.get('summary', 'Unknown'))
-        count += 1
-        
     return f"Cancelled {count} events from {start_time.strftime('%Y-%m-%d')} to {end_time.strftime('%Y-%m-%d')}:\n- " + "\n- ".join(deleted_titles)
 
 async def cancel_events_starting_from(start_str: str) -> str:
-    local_tz = get_localzone_name()
-    start_date = dateparser.parse(start_str, settings={'TIMEZONE': local_tz, 'RETURN_AS_TIMEZONE_AWARE': True})
+    start_date = time_parser.parse_time(start_str, prefer_future=False)
     
     if not start_date:
         return f"Could not parse date '{start_str}'."
@@ -289,18 +343,11 @@ async def cancel_events_starting_from(start_str: str) -> str:
     start_time = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
     end_time = start_time + datetime.timedelta(days=365)
     
-    events = calendar_service.list_events_in_range(start_time, end_time)
+    count, deleted_titles = await _cancel_events_in_range(start_time, end_time)
     
-    if not events:
+    if not deleted_titles:
         return f"No events found starting from {start_time.strftime('%Y-%m-%d')}."
         
-    count = 0
-    deleted_titles = []
-    for event in events:
-        calendar_service.delete_event(event['id'])
-        deleted_titles.append(event.get('summary', 'Unknown'))
-        count += 1
-        
     return f"Cancelled {count} events starting from {start_time.strftime('%Y-%m-%d')}:\n- " + "\n- ".join(deleted_titles)
 
 # --- Where to Watch ---
@@ -314,7 +361,7 @@ async def get_where_to_watch_logic(title: str, country: str = "India") -> str:
     }
     country_code = COUNTRY_CODES.get(country.lower(), country.upper())
     
-    results = await movie_service.search_movies(title)
+    results = await movie_service.resolve_title(title)
     if not results:
         return f"Could not find '{title}'."
     
@@ -322,7 +369,9 @@ async def get_where_to_watch_logic(title: str, country: str = "India") -> str:
     media_type = item.get('media_type', 'movie')
     title_str = item.get('title') if media_type == 'movie' else item.get('name')
     
-    providers = await movie_service.get_watch_providers(item['id'], country_code, media_type)
+    # Fetched with the details in one request, so a follow-up details lookup is free
+    bundle = await movie_service.get_title_bundle(item['id'], media_type)
+    providers = bundle.get('watch/providers', {}).get('results', {}).get(country_code, {})
     if not providers:
         return f"No streaming information found for '{title_str}' in {country} ({country_code})."
     
@@ -349,25 +398,136 @@ async def get_where_to_watch_logic(title: str, country: str = "India") -> str:
     return output
 
 # --- Lists ---
-async def get_history_logic() -> str:
-    history = database.get_history()
-    if not history:
-        return "History is empty."
-    
-    output = "Watch History:\n"
-    for title, rating, review, watched_at, media_type in history:
-        output += f"- [{media_type.upper()}] {title} ({rating}/10): {review} [Watched: {watched_at}]\n"
-    return output
+def _encode_cursor(row: tuple, key_index: int = 3) -> str:
+    # Listing rows carry their sort key (the date unless sorted otherwise) and their id last
+    return f"{row[key_index]}|{row[-1]}"
 
-async def get_watchlist_logic() -> str:
-    watchlist = database.get_watchlist()
-    if not watchlist:
-        return "Watchlist is empty."
-    
-    output = "Watchlist:\n"
-    for title, genre, release, added_at, media_type in watchlist:
-        output += f"- [{media_type.upper()}] {title} ({genre}) [Added: {added_at}]\n"
-    return output
+def _decode_cursor(cursor: str):
+    """(sort key, id) from a cursor string; raises ValueError if it is malformed."""
+    if not cursor:
+        return None
+    stamp, _, row_id = cursor.rpartition('|')
+    if not stamp:
+        raise ValueError(cursor)
+    return stamp, int(row_id)
+
+def _check_date(value: str):
+    if value:
+        datetime.date.fromisoformat(value)
+    return value or None
+
+def _format_page(header: str, lines: list, rows: list, limit: int, key_index: int = 3) -> str:
+    """Join a page of listing lines, pointing at the next page when there is one."""
+    output = [header, *lines]
+    if len(rows) > limit:
+        output.append(f"(More entries: pass cursor='{_encode_cursor(rows[limit - 1], key_index)}' for the next page.)")
+    return "\n".join(output) + "\n"
+
+async def get_history_logic(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str = "",
+    media_type: str = "",
+    min_rating: float = None,
+    max_rating: float = None,
+    watched_from: str = "",
+    watched_to: str = "",
+) -> str:
+    try:
+        after = _decode_cursor(cursor)
+        watched_from, watched_to = _check_date(watched_from), _check_date(watched_to)
+    except ValueError:
+        return "Invalid cursor or date (dates are YYYY-MM-DD)."
+    
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # One extra row tells whether another page follows
+    rows = database.get_history_page(
+        limit + 1, after, media_type or None, min_rating, max_rating, watched_from, watched_to
+    )
+    if not rows:
+        return "No more entries." if cursor else "History is empty."
+    
+    lines = [
+        f"- [{m_type.upper()}] {title} ({rating}/10): {review} [Watched: {watched_at}]"
+        for title, rating, review, watched_at, m_type, _, _ in rows[:limit]
+    ]
+    return _format_page("Watch History:", lines, rows, limit)
+
+async def get_watchlist_logic(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str = "",
+    media_type: str = "",
+    added_from: str = "",
+    added_to: str = "",
+) -> str:
+    try:
+        after = _decode_cursor(cursor)
+        added_from, added_to = _check_date(added_from), _check_date(added_to)
+    except ValueError:
+        return "Invalid cursor or date (dates are YYYY-MM-DD)."
+    
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = database.get_watchlist_page(limit + 1, after, media_type or None, added_from, added_to)
+    if not rows:
+        return "No more entries." if cursor else "Watchlist is empty."
+    
+    lines = [
+        f"- [{m_type.upper()}] {title} ({genre}) [Added: {added_at}]"
+        for title, genre, release, added_at, m_type, _, _ in rows[:limit]
+    ]
+    return _format_page("Watchlist:", lines, rows, limit)
+
+async def _resolve_genre_ids(genre: str) -> list:
+    """Ids of every movie and TV genre whose name contains `genre` (or its usual spelling)."""
+    genres = database.get_genre_names() or await movie_service.get_genres()
+    needle = genre.strip().lower()
+    needles = {needle, GENRE_ALIASES.get(needle, needle)}
+    return [g_id for g_id, name in genres.items() if any(n in name.lower() for n in needles)]
+
+async def query_history_logic(
+    genre: str = "",
+    min_rating: float = None,
+    max_rating: float = None,
+    media_type: str = "",
+    watched_from: str = "",
+    watched_to: str = "",
+    text: str = "",
+    sort: str = "watched_at",
+    order: str = "desc",
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str = "",
+) -> str:
+    if sort not in database.HISTORY_SORT_KEYS:
+        return f"Unknown sort key '{sort}'. Use one of: {', '.join(database.HISTORY_SORT_KEYS)}."
+    if order.lower() not in ("asc", "desc"):
+        return "Order must be 'asc' or 'desc'."
+    try:
+        after = _decode_cursor(cursor)
+        watched_from, watched_to = _check_date(watched_from), _check_date(watched_to)
+    except ValueError:
+        return "Invalid cursor or date (dates are YYYY-MM-DD)."
+    
+    genre_ids = None
+    if genre:
+        genre_ids = await _resolve_genre_ids(genre)
+        if not genre_ids:
+            return f"Unknown genre '{genre}'."
+    
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    try:
+        rows = database.query_history(
+            limit + 1, after, sort, order.lower() == "desc", genre_ids, text.strip() or None,
+            media_type or None, min_rating, max_rating, watched_from, watched_to,
+        )
+    except ValueError:
+        return "Invalid cursor for this sort key."
+    if not rows:
+        return "No more entries." if cursor else "No history entries match."
+    
+    lines = [
+        f"- [{m_type.upper()}] {title} ({rating}/10){f' [{genres}]' if genres else ''}: {review} [Watched: {watched_at}]"
+        for title, rating, review, watched_at, m_type, genres, _, _ in rows[:limit]
+    ]
+    return _format_page("Matching History:", lines, rows, limit, key_index=6)
 
 # --- Stats ---
 async def clear_history_logic() -> str:
@@ -383,16 +543,24 @@ async def get_my_stats_logic() -> str:
     if not stats['total_watched']:
         return "No stats available yet. Log some movies!"
         
-    # Get genre names
-    genres = await movie_service.get_genres()
+    # Get genre names (stored locally once fetched from TMDB)
+    genres = database.get_genre_names()
+    if any(g_id not in genres for g_id, _ in stats['top_genres']):
+        genres = await movie_service.get_genres()
     
     top_genres_str = []
     for g_id, count in stats['top_genres']:
         name = genres.get(int(g_id), "Unknown")
         top_genres_str.append(f"{name} ({count})")
+    
+    by_type = ", ".join(f"{m_type.upper()}: {count}" for m_type, count in stats['by_media_type'].items())
+    histogram = ", ".join(f"{bucket}★ x{count}" for bucket, count in stats['rating_histogram'].items())
+    per_month = ", ".join(f"{month}: {count}" for month, count in stats['watched_per_month'])
         
     return f"""🎬 **Your Movie DNA**
-- **Total Watched**: {stats['total_watched']}
+- **Total Watched**: {stats['total_watched']} ({by_type})
 - **Average Rating**: {stats['avg_rating']:.1f}/10
-- **Top Genres**: {', '.join(top_genres_str)}
+- **Top Genres**: {', '.join(top_genres_str) or 'N/A'}
+- **Ratings**: {histogram or 'N/A'}
+- **Per Month**: {per_month}
 """
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import asyncio
+import datetime
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from core import database
+from services import calendar_service, calendar_async
+
+# The index answers title and series lookups locally. It is refreshed with an
+# incremental sync in the background once it is older than CALENDAR_SYNC_INTERVAL seconds.
+# Lookups never wait for a sync; until the first (full) one completes they use a Calendar
+# search. A sync is only waited on (for logging) for up to FULL_SYNC_TIMEOUT seconds.
+CALENDAR_SYNC_INTERVAL = float(os.getenv("CALENDAR_SYNC_INTERVAL", "300"))
+FULL_SYNC_TIMEOUT = 120
+
+_last_sync = 0.0
+_sync_task: Optional[asyncio.Future] = None
+# Held by the worker thread for the whole sync, even after a timed-out wait gave up on it,
+# so a second sync cannot start (and reset the index) while the first is still writing
+_sync_lock = threading.Lock()
+
+
+def sync() -> int:
+    """
+    Pull calendar changes since the stored sync token into the index (blocking).
+    Without a token, or when Google has expired it (410 Gone), rebuilds the index
+    from a full sync. Returns the number of changed events seen.
+    """
+    from googleapiclient.errors import HttpError
+    sync_token = database.get_calendar_sync_token()
+    if sync_token is None:
+        database.reset_calendar_events()
+
+    page_token = None
+    changed = 0
+    while True:
+        try:
+            events, page_token, next_sync_token = calendar_service.list_changes(sync_token, page_token)
+        except HttpError as e:
+            if sync_token and e.resp.status == 410:
+                database.reset_calendar_events()
+                sync_token, page_token, changed = None, None, 0
+                continue
+            raise
+
+        rows, gone = [], []
+        for event in events:
+            row = calendar_service.index_row(event)
+            if row:
+                rows.append(row)
+            else:
+                # Cancelled, or no longer (or never) a CineMate event
+                gone.append(event['id'])
+        with database.transaction():
+            database.delete_calendar_events(gone)
+            database.upsert_calendar_events(rows)
+        changed += len(events)
+
+        if not page_token:
+            database.set_calendar_sync_token(next_sync_token, time.time())
+            return changed
+
+
+def _sync_once():
+    """Run sync() unless one is already running, and note when it finished (blocking)."""
+    global _last_sync
+    if not _sync_lock.acquire(blocking=False):
+        return
+    try:
+        sync()
+    finally:
+        _last_sync = time.monotonic()
+        _sync_lock.release()
+
+
+async def _run_sync():
+    try:
+        await calendar_async.run(_sync_once, timeout=FULL_SYNC_TIMEOUT)
+    except TimeoutError:
+        print("Warning: calendar index sync is taking long; it continues in the background.")
+    except Exception as e:
+        print(f"Warning: calendar index sync failed: {e}")
+
+
+def _ensure_fresh() -> bool:
+    """
+    Start a background sync when the index is stale and no sync is running. Returns
+    whether the index can answer lookups, which it cannot until a first full sync has completed.
+    """
+    global _sync_task
+    idle = (_sync_task is None or _sync_task.done()) and not _sync_lock.locked()
+    if idle and time.monotonic() - _last_sync >= CALENDAR_SYNC_INTERVAL:
+        _sync_task = asyncio.ensure_future(_run_sync())
+    return database.get_calendar_sync_token() is not None
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _as_event(row: Tuple) -> Dict[str, Any]:
+    """An index row in the shape of a Calendar API event."""
+    event_id, _, _, _, summary, description, start, end, link, tags = row
+    return {
+        'id': event_id,
+        'summary': summary,
+        'description': description,
+        'start': {'dateTime': start},
+        'end': {'dateTime': end},
+        'htmlLink': link,
+        'extendedProperties': {'private': json.loads(tags or '{}')},
+    }
+
+
+async def find_events(query: str, kind: Optional[str] = None, max_results: int = 5) -> List[Dict[str, Any]]:
+    """
+    Upcoming or in-progress CineMate events whose title or summary contains `query`,
+    soonest first.
+    Answered from the local index; before its first sync has finished, or for events it
+    does not know (created before tagging, or by hand), a free-text Calendar search is used instead.
+    """
+    if _ensure_fresh():
+        rows = database.find_calendar_events(text=query, kind=kind, end_after=_now(), limit=max_results)
+        if rows:
+            return [_as_event(row) for row in rows]
+    return await calendar_async.list_events(query=query, max_results=max_results)
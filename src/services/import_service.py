@@ -0,0 +1,240 @@
+import os
+import csv
+import json
+import asyncio
+import datetime
+import itertools
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from core import database
+from services import movie_service
+
+# Rows read, resolved and committed together; each batch is one transaction
+IMPORT_BATCH_SIZE = 200
+# Max titles resolved at once while importing
+IMPORT_CONCURRENCY = 8
+# Unresolved rows named in the import summary
+UNRESOLVED_SHOWN = 10
+
+EXPORT_COLUMNS = {
+    'history': ['title', 'media_type', 'tmdb_id', 'rating', 'review', 'watched_at'],
+    'watchlist': ['title', 'year', 'media_type', 'tmdb_id', 'added_at'],
+}
+
+Progress = Callable[[int, str], Awaitable[None]]
+
+
+def _file_format(path: str, fmt: str = "") -> str:
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.')).lower()
+    if fmt in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if fmt == 'csv':
+        return 'csv'
+    raise ValueError(f"Unsupported format '{fmt}' (use csv or jsonl).")
+
+
+def _read_rows(f, fmt: str) -> Iterator[Optional[Dict[str, str]]]:
+    """Records of a CSV or JSONL file with lower-cased keys; None for a line that is not valid JSON."""
+    if fmt == 'csv':
+        for row in csv.DictReader(f):
+            yield {(k or '').strip().lower(): (v or '').strip() for k, v in row.items()}
+        return
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield {str(k).lower(): '' if v is None else str(v).strip() for k, v in record.items()} if isinstance(record, dict) else None
+
+
+def _timestamp(value: str) -> Optional[str]:
+    """A date or date-time in the 'YYYY-MM-DD HH:MM:SS' form SQLite's CURRENT_TIMESTAMP uses."""
+    try:
+        return datetime.datetime.fromisoformat(value[:19]).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def _number(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _entry(row: Dict[str, str]) -> Dict[str, Any]:
+    """
+    One row of a CineMate, Letterboxd or IMDb export in a common shape. Letterboxd rates
+    out of 5 and lists only films; IMDb ids come in `const` and the kind of title in `title type`.
+    """
+    imdb_id = row.get('const') or row.get('imdb_id') or ''
+    title_type = row.get('title type', '').lower()
+    media_type = row.get('media_type') or ('tv' if title_type.startswith(('tv series', 'tv mini')) else 'movie')
+
+    rating = _number(row.get('your rating') or row.get('rating') or '')
+    if rating is not None and 'letterboxd uri' in row:
+        rating *= 2
+
+    date = next((row[key] for key in ('watched date', 'date rated', 'watched_at', 'added_at', 'created', 'date') if row.get(key)), '')
+    tmdb_id = row.get('tmdb_id', '')
+    return {
+        'title': row.get('title') or row.get('name') or '',
+        'year': (row.get('year') or row.get('release_date') or '')[:4],
+        'media_type': media_type if media_type in ('movie', 'tv') else 'movie',
+        'tmdb_id': int(tmdb_id) if tmdb_id.isdigit() else None,
+        'imdb_id': imdb_id if imdb_id.startswith('tt') else '',
+        'rating': rating,
+        'review': row.get('review', ''),
+        'date': _timestamp(date) if date else None,
+    }
+
+
+async def _resolve(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The search result for an import entry: by TMDB id, then IMDb id, then title and year."""
+    if entry['tmdb_id']:
+        return await movie_service.get_title(entry['tmdb_id'], entry['media_type'])
+    if entry['imdb_id']:
+        found = await movie_service.find_by_imdb_id(entry['imdb_id'])
+        if found:
+            return found
+    if not entry['title']:
+        return None
+    query = f"{entry['title']} {entry['year']}" if entry['year'] else entry['title']
+    results = await movie_service.resolve_title(query, media_type=entry['media_type'])
+    # Searches return both kinds; the export says which one it was
+    matching = [r for r in results if r.get('media_type') == entry['media_type']]
+    return (matching or results or [None])[0]
+
+
+async def _resolve_batch(entries: List[Optional[Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Resolve a batch concurrently. A TMDB outage or rate limit aborts the batch (nothing of
+    it is committed, so a later run retries it); other failures leave the entry unresolved.
+    """
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+
+    async def run(entry):
+        if entry is None:
+            return None
+        async with semaphore:
+            try:
+                return await _resolve(entry)
+            except movie_service.TMDBError as e:
+                if e.status == 404:
+                    return None
+                raise
+            except Exception as e:
+                print(f"Warning: could not resolve import row {entry['title'] or entry['imdb_id']}: {e}")
+                return None
+
+    return await asyncio.gather(*(run(entry) for entry in entries))
+
+
+def _batch_item(target: str, entry: Dict[str, Any], item: Dict[str, Any]) -> Tuple:
+    media_type = item.get('media_type', 'movie')
+    if target == 'history':
+        return (item['id'], entry['rating'], entry['review'], media_type, entry['date'])
+    return (item['id'], media_type, entry['date'])
+
+
+def _label(entry: Optional[Dict[str, Any]], line: int) -> str:
+    if entry and entry['title']:
+        return f"{entry['title']} ({entry['year']})" if entry['year'] else entry['title']
+    return (entry and entry['imdb_id']) or f"row {line}"
+
+
+async def import_file(path: str, target: str = "history", fmt: str = "", progress: Optional[Progress] = None) -> str:
+    """
+    Import a CineMate, Letterboxd or IMDb export (CSV or JSONL) into history or the watchlist.
+    The file is streamed IMPORT_BATCH_SIZE rows at a time: each batch is resolved concurrently
+    and committed in one transaction with the job's progress, so running the same import
+    again after an interruption continues after the last committed batch.
+    """
+    if target not in EXPORT_COLUMNS:
+        return "Target must be 'history' or 'watchlist'."
+    path = os.path.abspath(os.path.expanduser(path))
+    try:
+        fmt = _file_format(path, fmt)
+        stat = os.stat(path)
+    except (ValueError, OSError) as e:
+        return f"Cannot import '{path}': {e}"
+
+    job = database.start_import_job(path, target, stat.st_size, stat.st_mtime)
+    resumed_at = job['rows_done']
+    unresolved_labels = []
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = itertools.islice(_read_rows(f, fmt), resumed_at, None)
+        while True:
+            chunk = await asyncio.to_thread(lambda: list(itertools.islice(rows, IMPORT_BATCH_SIZE)))
+            if not chunk:
+                break
+            entries = [_entry(row) if row else None for row in chunk]
+            try:
+                resolved = await _resolve_batch(entries)
+            except movie_service.TMDBError as e:
+                return (
+                    f"Import paused after {job['rows_done']} rows ({job['imported']} imported): {e}. "
+                    "Run the same import again to resume."
+                )
+
+            movies, items, unresolved = [], [], 0
+            for line, (entry, item) in enumerate(zip(entries, resolved), job['rows_done'] + 1):
+                if item is None:
+                    unresolved += 1
+                    if len(unresolved_labels) < UNRESOLVED_SHOWN:
+                        unresolved_labels.append(_label(entry, line))
+                    continue
+                movies.append(movie_service.movie_cache_row(item))
+                items.append(_batch_item(target, entry, item))
+            database.save_import_batch(job, len(chunk), movies, items, unresolved)
+            if progress:
+                await progress(job['rows_done'], f"{job['imported']} imported, {job['unresolved']} unresolved")
+
+    database.finish_import_job(job)
+    output = [f"Imported {job['imported']} of {job['rows_done']} rows into {target}."]
+    if resumed_at:
+        output.append(f"(Resumed after row {resumed_at}.)")
+    if job['unresolved']:
+        output.append(f"{job['unresolved']} rows could not be matched, e.g.: {', '.join(unresolved_labels) or 'see an earlier run'}")
+    return "\n".join(output)
+
+
+def _export_records(target: str) -> Iterator[Dict[str, Any]]:
+    if target == 'history':
+        for title, rating, review, watched_at, media_type, movie_id, _ in database.iter_history():
+            yield {'title': title, 'media_type': media_type, 'tmdb_id': movie_id,
+                   'rating': rating, 'review': review, 'watched_at': watched_at}
+    else:
+        for title, _, release_date, added_at, media_type, movie_id, _ in database.iter_watchlist():
+            yield {'title': title, 'year': (release_date or '')[:4], 'media_type': media_type,
+                   'tmdb_id': movie_id, 'added_at': added_at}
+
+
+def export_file(path: str, target: str = "history", fmt: str = "") -> int:
+    """
+    Write history or the watchlist to a CSV or JSONL file (blocking), streaming rows from
+    the database in batches. The file is replaced only once it is complete.
+    Returns the number of rows written.
+    """
+    if target not in EXPORT_COLUMNS:
+        raise ValueError("Target must be 'history' or 'watchlist'.")
+    path = os.path.abspath(os.path.expanduser(path))
+    fmt = _file_format(path, fmt)
+
+    count = 0
+    partial = path + '.part'
+    with open(partial, 'w', newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS[target])
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            write = lambda record: f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        for record in _export_records(target):
+            write(record)
+            count += 1
+    os.replace(partial, path)
+    return count
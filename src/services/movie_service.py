@@ -1,101 +1,665 @@
 import os
+import re
+import json
+import time
+import random
+import asyncio
 import httpx
-from typing import Dict, List, Optional, Any
+import httpcore
+import importlib.util
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Any, Tuple
+from urllib.parse import urlencode
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
 from core import database
-import socket
-from unittest.mock import patch
-import contextlib
 
 load_dotenv()
 
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
-BASE_URL = "https://api.themoviedb.org/3"
+TMDB_HOST = "api.themoviedb.org"
+BASE_URL = f"https://{TMDB_HOST}/3"
 
 if not TMDB_API_KEY:
     print("Warning: TMDB_API_KEY not found in environment variables.")
 
+# Connection pool settings for the shared TMDB client (overridable via env)
+TMDB_TIMEOUT = float(os.getenv("TMDB_TIMEOUT", "30"))
+TMDB_MAX_CONNECTIONS = int(os.getenv("TMDB_MAX_CONNECTIONS", "20"))
+TMDB_MAX_KEEPALIVE = int(os.getenv("TMDB_MAX_KEEPALIVE", "10"))
+TMDB_KEEPALIVE_EXPIRY = float(os.getenv("TMDB_KEEPALIVE_EXPIRY", "60"))
+# HTTP/2 needs the optional `h2` package (httpx[http2])
+TMDB_HTTP2 = importlib.util.find_spec("h2") is not None
 
-async def get_tmdb_ip() -> Optional[str]:
-    """Resolve TMDB IP using Google DNS-over-HTTPS to bypass ISP blocks."""
+# Request pacing, shared by every coroutine: a token bucket refilled at TMDB_RATE_LIMIT
+# requests/second (TMDB allows roughly 50/s per IP) holding up to TMDB_RATE_BURST tokens
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "40"))
+TMDB_RATE_BURST = int(os.getenv("TMDB_RATE_BURST", "20"))
+# Retries of 429s, 5xx responses and network errors, with full-jitter exponential backoff
+TMDB_MAX_RETRIES = 4
+TMDB_BACKOFF_BASE = 0.5
+TMDB_BACKOFF_MAX = 30.0
+# After CIRCUIT_FAILURE_THRESHOLD consecutive failed requests TMDB is considered down for
+# CIRCUIT_RESET_TIMEOUT seconds: calls fail fast and cached data is served instead
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30.0
+
+# Response cache TTLs in seconds, per endpoint kind. Once expired, an entry is still
+# served for another CACHE_STALE_FACTOR * ttl while a background task refreshes it.
+CACHE_TTLS = {
+    "search": 15 * 60,
+    "details": 6 * 3600,
+    "providers": 6 * 3600,
+    "season": 24 * 3600,
+    "genres": 7 * 86400,
+}
+CACHE_STALE_FACTOR = 1.0
+
+# Sub-resources fetched alongside a title's details by get_title_bundle.
+# TMDB accepts at most APPEND_LIMIT of them per append_to_response request.
+BUNDLE_APPENDS = ("watch/providers", "credits", "external_ids")
+APPEND_LIMIT = 20
+
+# Minutes assumed for an episode when TMDB has no runtime for it or the show
+DEFAULT_EPISODE_RUNTIME = 45
+
+# In-process memo of search results, keyed on normalized query text
+SEARCH_MEMO_SIZE = 256
+
+# DNS-over-HTTPS settings. Answers are cached for their TTL (clamped to DNS_MIN_TTL);
+# failed lookups are retried after DNS_FAILURE_BACKOFF seconds. The resolver must speak
+# the JSON API of dns.google (overridable via env).
+DOH_URL = os.getenv("TMDB_DOH_URL", "https://dns.google/resolve")
+DNS_MIN_TTL = 30
+DNS_FAILURE_BACKOFF = 60
+
+# Global cache for the IP
+_TMDB_IP: Optional[str] = None
+_TMDB_IP_EXPIRES = 0.0
+_dns_lock = asyncio.Lock()
+
+
+async def _resolve_doh(hostname: str) -> Tuple[Optional[str], int]:
+    """Resolve an A record via DNS-over-HTTPS. Returns (ip, ttl) or (None, 0)."""
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                "https://dns.google/resolve",
-                params={"name": "api.themoviedb.org", "type": "A"}
-            )
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            resp = await client.get(DOH_URL, params={"name": hostname, "type": "A"})
             data = resp.json()
-            if "Answer" in data:
-                return data["Answer"][0]["data"]
+        # The answer may start with CNAME records; only type 1 (A) carries an IP
+        for answer in data.get("Answer", []):
+            if answer.get("type") == 1:
+                return answer["data"], int(answer.get("TTL", 0))
     except Exception as e:
         print(f"DNS-over-HTTPS failed: {e}")
-    return None
+    return None, 0
 
-# Global cache for the IP
-_TMDB_IP: Optional[str] = None
 
-@contextlib.asynccontextmanager
-async def dns_bypass():
-    """Context manager to patch DNS resolution for TMDB."""
-    global _TMDB_IP
-    if not _TMDB_IP:
-        _TMDB_IP = await get_tmdb_ip()
-    
-    if not _TMDB_IP:
-        yield
-        return
+async def get_tmdb_ip() -> Optional[str]:
+    """Resolve TMDB IP over DNS-over-HTTPS (DOH_URL) to bypass ISP blocks, honouring the answer TTL."""
+    global _TMDB_IP, _TMDB_IP_EXPIRES
+    if time.monotonic() < _TMDB_IP_EXPIRES:
+        return _TMDB_IP
+
+    async with _dns_lock:
+        # Another coroutine may have refreshed it while we waited
+        if time.monotonic() < _TMDB_IP_EXPIRES:
+            return _TMDB_IP
+
+        ip, ttl = await _resolve_doh(TMDB_HOST)
+        if ip:
+            _TMDB_IP = ip
+            _TMDB_IP_EXPIRES = time.monotonic() + max(ttl, DNS_MIN_TTL)
+        else:
+            # Keep any previous IP (a stale edge usually still works) and retry later
+            _TMDB_IP_EXPIRES = time.monotonic() + DNS_FAILURE_BACKOFF
+        return _TMDB_IP
+
+
+def invalidate_tmdb_ip():
+    """Forget the resolved IP so the next connection resolves it again."""
+    global _TMDB_IP, _TMDB_IP_EXPIRES
+    _TMDB_IP = None
+    _TMDB_IP_EXPIRES = 0.0
+
+
+class _TMDBNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that connects api.themoviedb.org to the DoH-resolved IP.
+    Falls back to system DNS when DoH has no answer or the IP refuses connections.
+    TLS SNI and the Host header still use the hostname, so certificates verify as usual.
+    """
+
+    def __init__(self):
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        if host == TMDB_HOST:
+            ip = await get_tmdb_ip()
+            if ip:
+                try:
+                    return await self._backend.connect_tcp(ip, port, timeout, local_address, socket_options)
+                except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                    print(f"Connecting to TMDB at {ip} failed ({e}), falling back to system DNS.")
+                    invalidate_tmdb_ip()
+        return await self._backend.connect_tcp(host, port, timeout, local_address, socket_options)
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds):
+        await self._backend.sleep(seconds)
+
+
+class _TMDBTransport(httpx.AsyncHTTPTransport):
+    """HTTP transport whose connection pool resolves TMDB through _TMDBNetworkBackend."""
+
+    def __init__(self, limits: httpx.Limits, http2: bool):
+        super().__init__(limits=limits, http2=http2)
+        # httpx has no resolver hook, so swap in a pool built on our network backend
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=_TMDBNetworkBackend(),
+        )
+
+# Shared client, created lazily or by start_client() and closed by close_client()
+_client: Optional[httpx.AsyncClient] = None
+_pool_stats = {"requests": 0, "connections_opened": 0}
+
+
+async def _trace(event_name: str, info: dict):
+    """httpcore trace hook: count new TCP connections to tell them apart from reused ones."""
+    if event_name == "connection.connect_tcp.complete":
+        _pool_stats["connections_opened"] += 1
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared TMDB client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        limits = httpx.Limits(
+            max_connections=TMDB_MAX_CONNECTIONS,
+            max_keepalive_connections=TMDB_MAX_KEEPALIVE,
+            keepalive_expiry=TMDB_KEEPALIVE_EXPIRY,
+        )
+        _client = httpx.AsyncClient(
+            timeout=TMDB_TIMEOUT,
+            transport=_TMDBTransport(limits=limits, http2=TMDB_HTTP2),
+        )
+    return _client
+
+
+async def start_client():
+    """Open the shared client. Called when the MCP server starts."""
+    get_client()
+
+
+async def close_client():
+    """Close the shared client and its pooled connections. Called on server shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Connection reuse statistics for the shared TMDB client."""
+    stats = dict(_pool_stats)
+    stats["connections_reused"] = max(stats["requests"] - stats["connections_opened"], 0)
+    stats["http2"] = TMDB_HTTP2
+    stats["open_connections"] = 0
+    stats["idle_connections"] = 0
+    # httpx does not expose its pool publicly; peek at it when available
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    for conn in getattr(pool, "connections", []):
+        if not conn.is_closed():
+            stats["open_connections"] += 1
+            if conn.is_idle():
+                stats["idle_connections"] += 1
+    return stats
+
+
+# --- Errors, rate limiting and retries ---
+class TMDBError(Exception):
+    """A TMDB request failed. `status` is the HTTP status, if there was a response."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class TMDBRateLimited(TMDBError):
+    """TMDB kept answering 429 Too Many Requests after every retry."""
+
+
+class TMDBUnavailable(TMDBError):
+    """TMDB is unreachable or failing (5xx / network errors), or the circuit breaker is open."""
+
+
+class _TokenBucket:
+    """Async token bucket. pause() holds back every caller, e.g. for a Retry-After."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class _CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets a trial call through after `reset_timeout`."""
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    def is_open(self) -> bool:
+        if self.opened_at is None:
+            return False
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # Half-open: the next call is the trial; one more failure reopens the circuit
+            self.opened_at = None
+            self.failures = self.threshold - 1
+            return False
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+_bucket: Optional[_TokenBucket] = None
+_circuit = _CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+_retry_stats = {"retries": 0, "rate_limited": 0, "failures": 0, "short_circuited": 0}
+
+
+def _get_bucket() -> _TokenBucket:
+    # Created lazily so its lock belongs to the running event loop
+    global _bucket
+    if _bucket is None:
+        _bucket = _TokenBucket(TMDB_RATE_LIMIT, TMDB_RATE_BURST)
+    return _bucket
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(TMDB_BACKOFF_MAX, TMDB_BACKOFF_BASE * 2 ** attempt))
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date)."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_retry_stats() -> Dict[str, Any]:
+    """Retry, rate-limit and circuit breaker counters for TMDB requests."""
+    return {**_retry_stats, "circuit_open": _circuit.opened_at is not None}
 
-    original_getaddrinfo = socket.getaddrinfo
-    
-    def new_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
-        # Handle both str and bytes
-        if host == "api.themoviedb.org" or host == b"api.themoviedb.org":
-            # print(f"Redirecting {host} to {_TMDB_IP}")
-            return original_getaddrinfo(_TMDB_IP, port, family, type, proto, flags)
-        return original_getaddrinfo(host, port, family, type, proto, flags)
-        
-    with patch("socket.getaddrinfo", side_effect=new_getaddrinfo):
-        yield
 
 async def make_request(endpoint: str, params: dict) -> Dict[str, Any]:
+    """
+    GET a TMDB endpoint, paced by the shared token bucket.
+    429s, 5xx responses and network errors are retried with backoff (honouring
+    Retry-After); other 4xx responses raise TMDBError straight away.
+    """
     url = f"{BASE_URL}{endpoint}"
     
-    # Use the DNS bypass context manager
-    async with dns_bypass():
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
+    for attempt in range(TMDB_MAX_RETRIES + 1):
+        if _circuit.is_open():
+            _retry_stats["short_circuited"] += 1
+            raise TMDBUnavailable(f"TMDB is unavailable, not calling {endpoint} for now")
+        await _get_bucket().acquire()
+        
+        try:
+            response = await get_client().get(url, params=params, extensions={"trace": _trace})
+        except httpx.TransportError as e:
+            error: TMDBError = TMDBUnavailable(f"TMDB request to {endpoint} failed: {e!r}")
+            delay = _backoff(attempt)
+        else:
+            _pool_stats["requests"] += 1
+            status = response.status_code
+            if status < 400:
+                _circuit.record_success()
+                return response.json()
+            if status == 429:
+                _retry_stats["rate_limited"] += 1
+                wait = _retry_after(response)
+                delay = max(wait or 0.0, _backoff(attempt))
+                # Everyone backs off, not just this request
+                _get_bucket().pause(delay)
+                error = TMDBRateLimited(f"TMDB rate limit hit on {endpoint}", status)
+            elif status >= 500:
+                error = TMDBUnavailable(f"TMDB returned {status} for {endpoint}", status)
+                delay = _backoff(attempt)
+            else:
+                _circuit.record_success()
+                raise TMDBError(f"TMDB returned {status} for {endpoint}", status)
+        
+        if attempt < TMDB_MAX_RETRIES:
+            _retry_stats["retries"] += 1
+            await asyncio.sleep(delay)
+    
+    _retry_stats["failures"] += 1
+    if isinstance(error, TMDBUnavailable):
+        _circuit.record_failure()
+    raise error
+
+# --- Response cache ---
+# Keys of entries currently being refreshed in the background
+_revalidating: Dict[str, asyncio.Task] = {}
+
+
+def _cache_key(endpoint: str, params: dict) -> str:
+    # The API key does not change the response, so keep it out of the key
+    return endpoint + "?" + urlencode(sorted((k, v) for k, v in params.items() if k != "api_key"))
+
+
+async def _fetch_and_cache(key: str, endpoint: str, params: dict, kind: str, on_fetch: Optional[Callable] = None) -> Dict[str, Any]:
+    data = await make_request(endpoint, params)
+    database.set_cached_response(key, json.dumps(data), time.time() + CACHE_TTLS[kind])
+    if on_fetch:
+        on_fetch(data)
+    return data
+
+
+def _revalidate(key: str, endpoint: str, params: dict, kind: str, on_fetch: Optional[Callable] = None):
+    """Refresh a stale cache entry in the background (at most one refresh per key)."""
+    if key in _revalidating or _circuit.is_open():
+        return
+
+    async def refresh():
+        try:
+            await _fetch_and_cache(key, endpoint, params, kind, on_fetch)
+        except Exception as e:
+            print(f"Background refresh of {endpoint} failed: {e}")
+        finally:
+            _revalidating.pop(key, None)
+
+    _revalidating[key] = asyncio.create_task(refresh())
+
+
+async def cached_request(endpoint: str, params: dict, kind: str, on_fetch: Optional[Callable] = None) -> Dict[str, Any]:
+    """
+    Read-through wrapper around make_request backed by the SQLite response cache.
+    Fresh entries are returned as is; stale ones are returned immediately and refreshed
+    in the background, and even expired ones are used while TMDB is unavailable or
+    rate limiting.
+    `on_fetch` runs on every response that actually came from TMDB.
+    """
+    key = _cache_key(endpoint, params)
+    cached = database.get_cached_response(key)
+    if cached:
+        value, expires_at = cached
+        now = time.time()
+        if now < expires_at:
+            return json.loads(value)
+        if now < expires_at + CACHE_TTLS[kind] * CACHE_STALE_FACTOR:
+            _revalidate(key, endpoint, params, kind, on_fetch)
+            return json.loads(value)
+
+    try:
+        return await _fetch_and_cache(key, endpoint, params, kind, on_fetch)
+    except (TMDBUnavailable, TMDBRateLimited) as e:
+        # Outdated data beats no data while TMDB is down or rate limiting us
+        if not cached:
+            raise
+        print(f"Serving expired cache for {endpoint}: {e}")
+        return json.loads(cached[0])
+
+
+def movie_cache_row(item: Dict[str, Any]) -> Tuple[int, str, str, str, str, str]:
+    """A movie/tv search result as a row for database.add_movies_cache_bulk."""
+    title = item.get("title") if item.get("media_type") == "movie" else item.get("name")
+    release_date = item.get("release_date") if item.get("media_type") == "movie" else item.get("first_air_date")
+    return (
+        item["id"],
+        title or "Unknown",
+        ", ".join([str(g) for g in (item.get("genre_ids") or [])]),
+        release_date or "",
+        item.get("overview", ""),
+        item.get("media_type", "movie")
+    )
+
+def _cache_search_results(data: Dict[str, Any]):
+    """Store movie/tv search results in the movies table."""
+    rows = [movie_cache_row(item) for item in data.get("results", []) if item.get("media_type") in ["movie", "tv"]]
+    if rows:
+        database.add_movies_cache_bulk(rows)
+
+# --- Search memo ---
+# normalized query -> (expires_at, results), least recently used first
+_search_memo: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+# normalized query -> lookup task shared by every caller waiting on it
+_search_inflight: Dict[str, asyncio.Task] = {}
+_search_memo_stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+def get_search_memo_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the in-process search memo."""
+    return {**_search_memo_stats, "size": len(_search_memo)}
+
+
+async def _search_uncached(query: str) -> List[Dict[str, Any]]:
+    data = await cached_request(
+        "/search/multi",
+        {"api_key": TMDB_API_KEY, "query": query, "language": "en-US", "page": 1},
+        "search",
+        on_fetch=_cache_search_results,
+    )
+    results = data.get("results", [])
+    
+    # Filter out people, only keep movie and tv
+    return [r for r in results if r.get("media_type") in ["movie", "tv"]]
+
+async def _search_and_memoize(key: str) -> List[Dict[str, Any]]:
+    try:
+        results = await _search_uncached(key)
+    finally:
+        del _search_inflight[key]
+    _search_memo[key] = (time.monotonic() + CACHE_TTLS["search"], results)
+    _search_memo.move_to_end(key)
+    while len(_search_memo) > SEARCH_MEMO_SIZE:
+        _search_memo.popitem(last=False)
+    return results
 
 async def search_movies(query: str) -> List[Dict[str, Any]]:
-    """Search for movies and TV shows by title."""
+    """
+    Search for movies and TV shows by title.
+    Repeat lookups are answered from an in-memory LRU, and concurrent identical
+    lookups share a single request. TMDB failures raise TMDBError rather than
+    looking like an empty result.
+    """
     if not TMDB_API_KEY:
         return []
     
-    try:
-        data = await make_request("/search/multi", {"api_key": TMDB_API_KEY, "query": query, "language": "en-US", "page": 1})
-        results = data.get("results", [])
-        
-        # Filter out people, only keep movie and tv
-        filtered_results = [r for r in results if r.get("media_type") in ["movie", "tv"]]
-        
-        # Cache results
-        for item in filtered_results:
-            title = item.get("title") if item.get("media_type") == "movie" else item.get("name")
-            release_date = item.get("release_date") if item.get("media_type") == "movie" else item.get("first_air_date")
-            
-            database.add_movie_cache(
-                item["id"],
-                title or "Unknown",
-                ", ".join([str(g) for g in (item.get("genre_ids") or [])]),
-                release_date or "",
-                item.get("overview", ""),
-                item.get("media_type", "movie")
-            )
-        return filtered_results
-    except Exception as e:
-        print(f"Search failed: {e}")
-        return []
+    key = _normalize_query(query)
+    entry = _search_memo.get(key)
+    if entry and entry[0] > time.monotonic():
+        _search_memo.move_to_end(key)
+        _search_memo_stats["hits"] += 1
+        return list(entry[1])
+    
+    task = _search_inflight.get(key)
+    if task:
+        _search_memo_stats["coalesced"] += 1
+    else:
+        _search_memo_stats["misses"] += 1
+        task = asyncio.ensure_future(_search_and_memoize(key))
+        # Failures are not memoized, so the next call retries. Reading the exception
+        # keeps asyncio quiet when every waiter was cancelled before it finished.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        _search_inflight[key] = task
+    # The lookup is its own task, so a cancelled caller does not cancel it for the others
+    return list(await asyncio.shield(task))
+
+# --- Title resolution ---
+# Trailing release year, as in "Dune 2021" or "Dune (2021)"
+_YEAR_SUFFIX = re.compile(r"^(.*\S)\s+\(?((?:19|20)\d\d)\)?$")
+_resolve_stats = {"local": 0, "remote": 0}
+
+
+def _result_year(item: Dict[str, Any]) -> str:
+    return (item.get("release_date") or item.get("first_air_date") or "")[:4]
+
+
+def _cached_result(row: Tuple) -> Dict[str, Any]:
+    """A movies table row in the shape of a /search/multi result."""
+    movie_id, media_type, title, release_date, overview, genre = row
+    title_key, date_key = ("title", "release_date") if media_type == "movie" else ("name", "first_air_date")
+    genre_ids = [int(g) for g in (genre or "").split(",") if g.strip().isdigit()]
+    return {
+        "id": movie_id,
+        "media_type": media_type,
+        title_key: title,
+        date_key: release_date,
+        "overview": overview,
+        "genre_ids": genre_ids,
+    }
+
+
+# A cached title answers a lookup only when it is the single title whose name equals the
+# query, ignoring case, accents and punctuation (core.database.title_key). Near-misses
+# ("Toy Story 2" for "Toy Story 3", "The Office" for "office") go to TMDB.
+def _best_cached_match(text: str, year: Optional[str], media_type: Optional[str]) -> Optional[Tuple]:
+    if not database.title_key(text):
+        return None
+    # Two rows are enough to tell whether the match is unique
+    exact = database.find_movies_by_title(text, year, media_type, limit=2)
+    if len(exact) != 1:
+        # Nothing exact, or several titles of the same name (remakes): let TMDB's ranking decide
+        return None
+    return exact[0]
+
+
+def resolve_cached(query: str, media_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Resolve a title from the local movies cache, or None unless exactly one cached title
+    has the same name, ignoring case, accents and punctuation. A trailing year
+    ("Dune 2021") is tried as part of the title first, then as a release year narrowing
+    down same-named titles.
+    """
+    row = _best_cached_match(query, None, media_type)
+    match = _YEAR_SUFFIX.match(query.strip())
+    if row is None and match:
+        row = _best_cached_match(match.group(1), match.group(2), media_type)
+    return _cached_result(row) if row else None
+
+
+def get_resolve_stats() -> Dict[str, int]:
+    """How many title lookups were answered locally vs. by TMDB."""
+    return dict(_resolve_stats)
+
+
+async def resolve_title(query: str, media_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Resolve a user-supplied title to search results, best first.
+    Answers from the local cache when it has a clear match (optionally only of
+    `media_type`); otherwise searches TMDB, preferring results from a trailing year.
+    """
+    cached = resolve_cached(query, media_type)
+    if cached:
+        _resolve_stats["local"] += 1
+        return [cached]
+    
+    _resolve_stats["remote"] += 1
+    match = _YEAR_SUFFIX.match(query.strip())
+    if match:
+        title, year = match.groups()
+        results = await search_movies(title)
+        if any(_result_year(r) == year for r in results):
+            return sorted(results, key=lambda r: _result_year(r) != year)
+    # No year, or the "year" belongs to the title ("Blade Runner 2049")
+    return await search_movies(query)
+
+def _cache_find_results(data: Dict[str, Any]):
+    """Store /find matches in the movies table like search results."""
+    _cache_search_results({"results": [
+        {**item, "media_type": media_type}
+        for media_type in ("movie", "tv")
+        for item in data.get(f"{media_type}_results", [])
+    ]})
+
+async def find_by_imdb_id(imdb_id: str) -> Optional[Dict[str, Any]]:
+    """The movie or TV show with an IMDb id ("tt0133093") as a search result, or None."""
+    if not TMDB_API_KEY:
+        return None
+    
+    data = await cached_request(
+        f"/find/{imdb_id}",
+        {"api_key": TMDB_API_KEY, "external_source": "imdb_id", "language": "en-US"},
+        "details",
+        on_fetch=_cache_find_results,
+    )
+    for media_type in ("movie", "tv"):
+        results = data.get(f"{media_type}_results") or []
+        if results:
+            return {**results[0], "media_type": media_type}
+    return None
+
+async def get_title(movie_id: int, media_type: str = "movie") -> Optional[Dict[str, Any]]:
+    """A title by TMDB id as a search result, from the movies cache when it is there."""
+    row = database.get_movie_cache(movie_id, media_type)
+    if row:
+        return _cached_result(row)
+    details = await get_movie_details(movie_id, media_type)
+    if not details:
+        return None
+    return {**details, "media_type": media_type, "genre_ids": [g["id"] for g in details.get("genres", [])]}
+
+def _part_request(movie_id: int, media_type: str, part: str = "") -> Tuple[str, dict, str]:
+    """
+    (endpoint, params, cache kind) of a title's details ("") or one of its sub-resources
+    ("watch/providers", "credits", "season/3", ...), as requested on their own.
+    """
+    if part.startswith("season/"):
+        return f"/tv/{movie_id}/{part}", {"api_key": TMDB_API_KEY, "language": "en-US"}, "season"
+    if part == "watch/providers":
+        return f"/{media_type}/{movie_id}/{part}", {"api_key": TMDB_API_KEY}, "providers"
+    endpoint = f"/{media_type}/{movie_id}" + (f"/{part}" if part else "")
+    return endpoint, {"api_key": TMDB_API_KEY, "language": "en-US"}, "details"
 
 async def get_movie_details(movie_id: int, media_type: str = "movie") -> Dict[str, Any]:
     """Get detailed information about a specific movie or TV show."""
@@ -103,9 +667,76 @@ async def get_movie_details(movie_id: int, media_type: str = "movie") -> Dict[st
         return {}
         
     try:
-        return await make_request(f"/{media_type}/{movie_id}", {"api_key": TMDB_API_KEY, "language": "en-US"})
-    except Exception:
+        return await cached_request(*_part_request(movie_id, media_type))
+    except TMDBError as e:
+        # Unknown ids are "not found"; rate limits and outages are reported as such
+        if e.status == 404:
+            return {}
+        raise
+
+async def get_title_bundle(movie_id: int, media_type: str = "movie", seasons: Iterable[int] = ()) -> Dict[str, Any]:
+    """
+    Details of a title together with BUNDLE_APPENDS and the given seasons, shaped like a
+    TMDB append_to_response reply ("watch/providers", "season/1", ... keys).
+    Parts missing from the cache are fetched in a single request (one per APPEND_LIMIT
+    sub-resources), and each part is cached under its own endpoint's key, so later
+    get_movie_details / get_watch_providers calls for the title need no request at all.
+    """
+    if not TMDB_API_KEY:
         return {}
+    
+    parts = ["", *BUNDLE_APPENDS, *(f"season/{number}" for number in seasons)]
+    keys = {part: _cache_key(*_part_request(movie_id, media_type, part)[:2]) for part in parts}
+    bundle, missing = {}, []
+    now = time.time()
+    for part in parts:
+        cached = database.get_cached_response(keys[part])
+        if cached and now < cached[1]:
+            bundle[part] = json.loads(cached[0])
+        else:
+            missing.append(part)
+    
+    appends = [part for part in missing if part]
+    if missing:
+        endpoint, params, _ = _part_request(movie_id, media_type)
+        chunks = [appends[i:i + APPEND_LIMIT] for i in range(0, len(appends), APPEND_LIMIT)] or [[]]
+        try:
+            responses = await asyncio.gather(*(
+                make_request(endpoint, {**params, "append_to_response": ",".join(chunk)} if chunk else params)
+                for chunk in chunks
+            ))
+        except (TMDBUnavailable, TMDBRateLimited):
+            # TMDB is down or rate limiting us: settle for whatever the cache has, however old
+            for part in missing:
+                cached = database.get_cached_response(keys[part])
+                if cached:
+                    bundle[part] = json.loads(cached[0])
+            if "" not in bundle:
+                raise
+        except TMDBError as e:
+            if e.status == 404:
+                return {}
+            raise
+        else:
+            for chunk, data in zip(chunks, responses):
+                for part in chunk:
+                    # TMDB leaves out sub-resources it does not have (e.g. a season number too high)
+                    if part in data:
+                        bundle[part] = data.pop(part)
+                bundle[""] = data
+            expires = time.time()
+            for part in missing:
+                if part in bundle:
+                    kind = _part_request(movie_id, media_type, part)[2]
+                    database.set_cached_response(keys[part], json.dumps(bundle[part]), expires + CACHE_TTLS[kind])
+    
+    result = dict(bundle[""])
+    result.update((part, value) for part, value in bundle.items() if part)
+    return result
+
+def _save_genres(data: Dict[str, Any]):
+    """Keep the local genre name table in sync with TMDB."""
+    database.save_genres({g["id"]: g["name"] for g in data.get("genres", [])})
 
 async def get_genres() -> Dict[int, str]:
     """Fetch genre list to map IDs to names (combines Movie and TV genres)."""
@@ -113,8 +744,8 @@ async def get_genres() -> Dict[int, str]:
         return {}
         
     try:
-        resp_movie = await make_request("/genre/movie/list", {"api_key": TMDB_API_KEY, "language": "en-US"})
-        resp_tv = await make_request("/genre/tv/list", {"api_key": TMDB_API_KEY, "language": "en-US"})
+        resp_movie = await cached_request("/genre/movie/list", {"api_key": TMDB_API_KEY, "language": "en-US"}, "genres", on_fetch=_save_genres)
+        resp_tv = await cached_request("/genre/tv/list", {"api_key": TMDB_API_KEY, "language": "en-US"}, "genres", on_fetch=_save_genres)
         
         genres = {}
         for g in resp_movie.get("genres", []):
@@ -124,16 +755,55 @@ async def get_genres() -> Dict[int, str]:
             
         return genres
     except Exception:
+        # Genre names are cosmetic: a missing one is shown as "Unknown"
         return {}
 
+async def get_episode_runtimes(show_id: int, details: Optional[Dict[str, Any]] = None) -> List[Tuple[int, int, int]]:
+    """
+    Every regular episode of a TV show as (season, episode, runtime in minutes), in airing order.
+    Seasons come from the local episode table; a season is fetched (batched through
+    get_title_bundle) only when it is missing or TMDB now lists a different episode count for it. Specials
+    (season 0) are left out, and unknown runtimes fall back to the show's typical runtime.
+    """
+    if details is None:
+        details = await get_title_bundle(show_id, "tv")
+    seasons = {
+        season["season_number"]: season.get("episode_count") or 0
+        for season in details.get("seasons", [])
+        if season.get("season_number")
+    }
+    
+    cached = database.get_season_episode_counts(show_id)
+    stale = [number for number, count in seasons.items() if cached.get(number, 0) != count]
+    if stale and TMDB_API_KEY:
+        # Up to APPEND_LIMIT seasons per request, with the requests running concurrently
+        bundle = await get_title_bundle(show_id, "tv", stale)
+        for number in stale:
+            data = bundle.get(f"season/{number}")
+            if data is None:
+                print(f"Warning: could not fetch season {number} of show {show_id}")
+                continue
+            database.save_season_episodes(
+                show_id, number, [(ep["episode_number"], ep.get("runtime")) for ep in data.get("episodes", [])]
+            )
+    
+    typical = details.get("episode_run_time") or [DEFAULT_EPISODE_RUNTIME]
+    return [
+        (season, episode, runtime or typical[0])
+        for season, episode, runtime in database.get_show_episodes(show_id)
+        if season in seasons
+    ]
+
 async def get_watch_providers(movie_id: int, country_code: str = "US", media_type: str = "movie") -> Dict[str, Any]:
     """Get streaming and rental providers for a movie or TV show."""
     if not TMDB_API_KEY:
         return {}
 
     try:
-        data = await make_request(f"/{media_type}/{movie_id}/watch/providers", {"api_key": TMDB_API_KEY})
+        data = await cached_request(*_part_request(movie_id, media_type, "watch/providers"))
         results = data.get("results", {})
         return results.get(country_code, {})
-    except Exception:
-        return {}
+    except TMDBError as e:
+        if e.status == 404:
+            return {}
+        raise
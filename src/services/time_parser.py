@@ -0,0 +1,164 @@
+import os
+import re
+import datetime
+import functools
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Natural-language times for the scheduling tools. Common phrases ("tonight", "tomorrow 8pm",
+# "friday at 9:30pm", ISO dates) are parsed directly; anything else goes to dateparser
+# (English only, so it skips language detection). Results are memoized per phrase and minute.
+
+# Hour used for "tonight" / "tomorrow night" when no time is given
+TONIGHT_HOUR = 20
+PARSE_MEMO_SIZE = 256
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+_DAY = (
+    r"(?P<day>today|tonight|tomorrow(?:\s+night)?|tmrw"
+    r"|(?:(?P<which>next|this)\s+)?(?P<weekday>(?:mon|tues?|wed(?:nes)?|thu(?:rs?)?|fri|sat(?:ur)?|sun)(?:day)?)"
+    r"|(?P<date>\d{4}-\d{2}-\d{2}))"
+)
+_TIME = (
+    r"(?:at\s+)?(?:(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>am|pm)"
+    r"|(?P<hour24>\d{1,2}):(?P<minute24>\d{2})|(?P<named>noon|midnight))"
+)
+_DAY_FIRST = re.compile(rf"(?:on\s+)?{_DAY}(?:\s+{_TIME})?")
+_TIME_FIRST = re.compile(rf"{_TIME}(?:\s+(?:on\s+)?{_DAY})?")
+
+_timezone: Optional[str] = None
+_stats = {"fast": 0, "dateparser": 0}
+
+
+def get_timezone() -> str:
+    """The timezone times are read in: CINEMATE_TIMEZONE if set (and valid), else the system's."""
+    global _timezone
+    if _timezone is None:
+        name = os.getenv("CINEMATE_TIMEZONE", "").strip()
+        if name:
+            try:
+                ZoneInfo(name)
+            except (ZoneInfoNotFoundError, ValueError):
+                print(f"Warning: unknown CINEMATE_TIMEZONE '{name}', using the system timezone.")
+                name = ""
+        if not name:
+            from tzlocal import get_localzone_name
+            name = get_localzone_name()
+        _timezone = name
+    return _timezone
+
+
+def _time_of_day(match: re.Match) -> Optional[datetime.time]:
+    groups = match.groupdict()
+    if groups["named"]:
+        return datetime.time(12) if groups["named"] == "noon" else datetime.time(0)
+    if groups["ampm"]:
+        hour, minute = int(groups["hour"]), int(groups["minute"] or 0)
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if groups["ampm"] == "pm" else 0)
+    elif groups["hour24"]:
+        hour, minute = int(groups["hour24"]), int(groups["minute24"])
+    else:
+        return None
+    if hour > 23 or minute > 59:
+        return None
+    return datetime.time(hour, minute)
+
+
+def _fast_parse(phrase: str, base: datetime.datetime, prefer_future: bool) -> Optional[datetime.datetime]:
+    """A common phrase relative to `base`, or None to leave it to dateparser."""
+    if phrase == "now":
+        return base
+    try:
+        moment = datetime.datetime.fromisoformat(phrase)
+        return moment if moment.tzinfo else moment.replace(tzinfo=base.tzinfo)
+    except ValueError:
+        pass
+
+    match = _DAY_FIRST.fullmatch(phrase) or _TIME_FIRST.fullmatch(phrase)
+    if not match:
+        return None
+    groups = match.groupdict()
+    time_of_day = _time_of_day(match)
+    if time_of_day is None and any(groups[g] for g in ("hour", "hour24", "named")):
+        return None
+
+    day, date = groups["day"], base.date()
+    if day is None:
+        # A bare time: today, or tomorrow once it has passed
+        moment = datetime.datetime.combine(date, time_of_day, base.tzinfo)
+        if prefer_future and moment <= base:
+            moment += datetime.timedelta(days=1)
+        return moment
+
+    if groups["date"]:
+        try:
+            date = datetime.date.fromisoformat(groups["date"])
+        except ValueError:
+            return None
+    elif groups["weekday"]:
+        if not prefer_future:
+            # Without a future preference, "friday" could be the last one or the next one
+            return None
+        weekday = next(i for i, name in enumerate(WEEKDAYS) if name.startswith(groups["weekday"][:3]))
+        date += datetime.timedelta(days=(weekday - date.weekday()) % 7)
+    elif day.startswith(("tomorrow", "tmrw")):
+        date += datetime.timedelta(days=1)
+
+    if time_of_day is None:
+        # As in dateparser, "today"/"tomorrow" on their own keep the current time of day while
+        # weekdays and dates start at midnight; "tonight" is TONIGHT_HOUR
+        if day.endswith("night"):
+            time_of_day = datetime.time(TONIGHT_HOUR)
+        elif groups["weekday"] or groups["date"]:
+            time_of_day = datetime.time(0)
+        else:
+            time_of_day = base.time()
+    moment = datetime.datetime.combine(date, time_of_day, base.tzinfo)
+    if groups["weekday"] and date == base.date():
+        # On a Friday, "friday" is next week (as in dateparser) and "friday 9pm" is today
+        # unless that time has passed; "next friday" is always next week
+        if groups["which"] == "next" or (groups["which"] != "this" and moment <= base):
+            moment += datetime.timedelta(days=7)
+    elif prefer_future and day in ("today", "tonight") and moment < base:
+        # "tonight" at 11pm or "today 8pm" at 9pm: the next one, like a bare "8pm"
+        moment += datetime.timedelta(days=1)
+    return moment
+
+
+@functools.lru_cache(maxsize=PARSE_MEMO_SIZE)
+def _parse(phrase: str, base: datetime.datetime, timezone: str, prefer_future: bool) -> Optional[datetime.datetime]:
+    moment = _fast_parse(phrase, base, prefer_future)
+    if moment is not None:
+        _stats["fast"] += 1
+        return moment
+
+    _stats["dateparser"] += 1
+    import dateparser
+    return dateparser.parse(phrase, languages=["en"], settings={
+        "PREFER_DATES_FROM": "future" if prefer_future else "current_period",
+        "TIMEZONE": timezone,
+        "TO_TIMEZONE": timezone,
+        "RETURN_AS_TIMEZONE_AWARE": True,
+        "RELATIVE_BASE": base.replace(tzinfo=None),
+    })
+
+
+def parse_time(text: str, prefer_future: bool = True) -> Optional[datetime.datetime]:
+    """
+    Parse a natural-language time ("tomorrow at 8pm", "friday", "2025-12-25 21:00") into an
+    aware datetime in get_timezone(), or None if it cannot be read. With prefer_future,
+    ambiguous times ("8pm", "friday") resolve to their next occurrence.
+    """
+    timezone = get_timezone()
+    base = datetime.datetime.now(ZoneInfo(timezone)).replace(second=0, microsecond=0)
+    phrase = " ".join(text.lower().replace(",", " ").split())
+    return _parse(phrase, base, timezone, prefer_future)
+
+
+def get_parse_stats() -> dict:
+    """How many phrases took the fast path vs. dateparser, and memo hits."""
+    info = _parse.cache_info()
+    return {**_stats, "memo_hits": info.hits, "memo_size": info.currsize}
@@ -0,0 +1,12 @@
+import pytest
+from core import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """core.database on a fresh, migrated database file."""
+    database.close_connection()
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "cinemate.db"))
+    database.init_db()
+    yield database
+    database.close_connection()
@@ -0,0 +1,88 @@
+import time
+import asyncio
+import datetime
+import pytest
+from services import binge_service, calendar_async, calendar_service
+
+EPISODES = [(1, number, 45) for number in range(1, 4)]
+
+
+class FakeCalendar:
+    """Stands in for the blocking calendar_service batch calls."""
+
+    def __init__(self, create_delay=0.0):
+        self.create_delay = create_delay
+        self.events = {}
+        self.created = 0
+
+    def create_events_batch(self, events):
+        time.sleep(self.create_delay)
+        results = []
+        for event in events:
+            self.created += 1
+            event_id = f"evt{self.created}"
+            self.events[event_id] = event
+            results.append({'ok': True, 'id': event_id, 'link': None, 'error': None})
+        return results
+
+    def update_events_batch(self, events):
+        for event in events:
+            self.events[event['event_id']] = event
+        return [{'ok': True, 'id': e['event_id'], 'link': None, 'error': None} for e in events]
+
+    def delete_events_batch(self, event_ids):
+        for event_id in event_ids:
+            self.events.pop(event_id, None)
+        return [{'ok': True, 'error': None} for _ in event_ids]
+
+
+@pytest.fixture
+def calendar(db, monkeypatch):
+    fake = FakeCalendar()
+    for name in ('create_events_batch', 'update_events_batch', 'delete_events_batch'):
+        monkeypatch.setattr(calendar_service, name, getattr(fake, name))
+    yield fake
+    calendar_async.shutdown()
+
+
+def _plan(db):
+    anchor = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    return db.create_binge_plan(1396, "Breaking Bad", 1, 0, anchor.isoformat())
+
+
+def test_timed_out_creates_are_not_created_twice(db, calendar, monkeypatch):
+    calendar.create_delay = 0.3
+    monkeypatch.setattr(calendar_async, "CALENDAR_TIMEOUT", 0.05)
+    plan = _plan(db)
+
+    async def scenario():
+        with pytest.raises(TimeoutError):
+            await binge_service._replan(plan, EPISODES)
+        # The worker finishes the batch after the timeout
+        await asyncio.sleep(0.5)
+        calendar.create_delay = 0
+        return await binge_service._replan(db.get_binge_plan(plan['id']), EPISODES)
+
+    report = asyncio.run(scenario())
+    assert report['created'] == 0
+    assert calendar.created == len(EPISODES)
+    assert sorted(s[5] for s in db.get_binge_sessions(plan['id'])) == sorted(calendar.events)
+
+
+def test_late_create_for_changed_session_is_deleted(db, calendar, monkeypatch):
+    calendar.create_delay = 0.3
+    monkeypatch.setattr(calendar_async, "CALENDAR_TIMEOUT", 0.05)
+    plan = _plan(db)
+
+    async def scenario():
+        with pytest.raises(TimeoutError):
+            await binge_service._replan(plan, EPISODES)
+        # Rescheduled before the timed-out batch finished
+        calendar.create_delay = 0
+        later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=3)
+        await binge_service._replan(db.get_binge_plan(plan['id']), EPISODES, start_time=later)
+        await asyncio.sleep(0.5)
+
+    asyncio.run(scenario())
+    assert calendar.created == 2 * len(EPISODES)
+    assert sorted(s[5] for s in db.get_binge_sessions(plan['id'])) == sorted(calendar.events)
@@ -0,0 +1,40 @@
+import asyncio
+import datetime
+import pytest
+from services import calendar_async, calendar_service, cine_service
+
+PAGE_SIZE = 2
+
+
+class PagedCalendar:
+    """Events listed through offset page tokens, like a result set that shifts under deletes."""
+
+    def __init__(self, count):
+        self.events = [{'id': f"evt{i}", 'summary': f"Movie {i}"} for i in range(count)]
+
+    def list_events_page(self, start_time, end_time=None, page_token=None, page_size=None, fields=None):
+        offset = int(page_token or 0)
+        page = self.events[offset:offset + PAGE_SIZE]
+        more = offset + PAGE_SIZE < len(self.events)
+        return [dict(e) for e in page], str(offset + PAGE_SIZE) if more else None
+
+    def delete_events_batch(self, event_ids):
+        self.events = [e for e in self.events if e['id'] not in event_ids]
+        return [{'ok': True, 'error': None} for _ in event_ids]
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    fake = PagedCalendar(7)
+    monkeypatch.setattr(calendar_service, "list_events_page", fake.list_events_page)
+    monkeypatch.setattr(calendar_service, "delete_events_batch", fake.delete_events_batch)
+    yield fake
+    calendar_async.shutdown()
+
+
+def test_cancel_range_deletes_every_page(calendar):
+    start = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    count, lines = asyncio.run(cine_service._cancel_events_in_range(start, start + datetime.timedelta(days=7)))
+    assert count == 7
+    assert lines == [f"Movie {i}" for i in range(7)]
+    assert calendar.events == []
@@ -0,0 +1,36 @@
+import sqlite3
+import pytest
+
+
+def test_failed_commit_does_not_leave_transaction_open(db):
+    # A deferred foreign key is only checked at COMMIT, which then fails with the
+    # transaction still open; the same state SQLITE_BUSY or a full disk leaves behind
+    with db.connection() as conn:
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+        conn.execute(
+            "CREATE TABLE child (parent_id INTEGER REFERENCES parent(id) DEFERRABLE INITIALLY DEFERRED)"
+        )
+
+    with pytest.raises(sqlite3.IntegrityError):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO child VALUES (1)")
+    assert not db.get_connection().in_transaction
+
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO parent VALUES (1)")
+    db.close_connection()
+    with db.connection() as conn:
+        assert conn.execute("SELECT id FROM parent").fetchall() == [(1,)]
+        assert conn.execute("SELECT parent_id FROM child").fetchall() == []
+
+
+def test_nested_transaction_joins_outer(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO genres (id, name) VALUES (1, 'Drama')")
+            with db.transaction() as inner:
+                inner.execute("INSERT INTO genres (id, name) VALUES (2, 'Comedy')")
+            raise RuntimeError
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM genres").fetchone()[0] == 0
@@ -0,0 +1,27 @@
+import time
+import asyncio
+import datetime
+from services import calendar_async, calendar_service, event_index
+
+
+def _event(event_id, summary, start_offset_minutes, duration_minutes=120):
+    start = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=start_offset_minutes)
+    body = calendar_service._event_body(summary, "", start, duration_minutes, {'kind': 'movie', 'title': summary})
+    return {**body, 'id': event_id, 'htmlLink': f"https://calendar.example/{event_id}"}
+
+
+def test_find_events_includes_event_in_progress(db, monkeypatch):
+    db.upsert_calendar_events([calendar_service.index_row(e) for e in (
+        _event("ended", "Watch Alien", -300),
+        _event("playing", "Watch Alien", -30),
+        _event("upcoming", "Watch Alien", 24 * 60),
+    )])
+    db.set_calendar_sync_token("token", time.time())
+    monkeypatch.setattr(event_index, "_last_sync", time.monotonic())
+
+    async def no_fallback(*args, **kwargs):
+        raise AssertionError("answered from the index")
+    monkeypatch.setattr(calendar_async, "list_events", no_fallback)
+
+    events = asyncio.run(event_index.find_events("alien", kind="movie"))
+    assert [e['id'] for e in events] == ["playing", "upcoming"]
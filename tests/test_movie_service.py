@@ -0,0 +1,36 @@
+import json
+import time
+import asyncio
+import pytest
+from services import movie_service
+
+
+def _expired_entry(db, endpoint, params, value):
+    """Cache `value` for the request as expired and past the stale-while-revalidate window."""
+    key = movie_service._cache_key(endpoint, params)
+    db.set_cached_response(key, json.dumps(value), time.time() - 10 * 365 * 86400)
+
+
+def _failing_request(error):
+    async def make_request(endpoint, params):
+        raise error
+    return make_request
+
+
+@pytest.mark.parametrize("error", [
+    movie_service.TMDBUnavailable("TMDB returned 503", 503),
+    movie_service.TMDBRateLimited("TMDB rate limit hit", 429),
+])
+def test_expired_cache_served_when_tmdb_fails(db, monkeypatch, error):
+    params = {"language": "en-US"}
+    _expired_entry(db, "/movie/603", params, {"id": 603, "title": "The Matrix"})
+    monkeypatch.setattr(movie_service, "make_request", _failing_request(error))
+
+    data = asyncio.run(movie_service.cached_request("/movie/603", params, "details"))
+    assert data == {"id": 603, "title": "The Matrix"}
+
+
+def test_tmdb_failure_without_cache_raises(db, monkeypatch):
+    monkeypatch.setattr(movie_service, "make_request", _failing_request(movie_service.TMDBRateLimited("429", 429)))
+    with pytest.raises(movie_service.TMDBRateLimited):
+        asyncio.run(movie_service.cached_request("/movie/603", {"language": "en-US"}, "details"))
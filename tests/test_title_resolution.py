@@ -0,0 +1,63 @@
+import pytest
+from services import movie_service
+
+CACHED = [
+    (862, "Toy Story", "16", "1995-11-22", "", "movie"),
+    (863, "Toy Story 2", "16", "1999-10-30", "", "movie"),
+    (2316, "The Office", "35", "2005-03-24", "", "tv"),
+    (126308, "Shōgun", "18", "2024-02-27", "", "tv"),
+    (194, "Amélie", "35", "2001-04-25", "", "movie"),
+    (438631, "Dune", "878", "2021-09-15", "", "movie"),
+    (841, "Dune", "878", "1984-12-14", "", "movie"),
+    (807, "Se7en", "80", "1995-09-22", "", "movie"),
+    (14836, "Up", "16", "2009-05-28", "", "movie"),
+]
+
+
+@pytest.fixture
+def cache(db):
+    db.add_movies_cache_bulk(CACHED)
+    return db
+
+
+def _resolved(query, media_type=None):
+    result = movie_service.resolve_cached(query, media_type)
+    return result and result["id"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Toy Story", 862),
+    ("toy story 2", 863),
+    ("Shogun", 126308),
+    ("SHŌGUN", 126308),
+    ("Amelie", 194),
+    ("se7en!", 807),
+    ("Up", 14836),
+    ("Dune 2021", 438631),
+    ("Dune (1984)", 841),
+])
+def test_unique_exact_match_resolves_locally(cache, query, expected):
+    assert _resolved(query) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "Toy Story 3",  # a near-miss is another film
+    "toy",          # prefixes are left to TMDB's ranking
+    "office",       # so are titles missing their article
+    "Dune",         # two films of the same name
+    "Dune 2000",
+    "",
+])
+def test_anything_but_a_unique_exact_match_goes_to_tmdb(cache, query):
+    assert _resolved(query) is None
+
+
+def test_media_type_narrows_matches(cache):
+    assert _resolved("The Office", "tv") == 2316
+    assert _resolved("The Office", "movie") is None
+
+
+def test_renamed_title_is_found_by_its_new_name(cache):
+    cache.add_movies_cache_bulk([(194, "Le Fabuleux Destin d'Amélie Poulain", "35", "2001-04-25", "", "movie")])
+    assert _resolved("Amelie") is None
+    assert _resolved("le fabuleux destin d amelie poulain") == 194